@@ -1,45 +1,92 @@
-import os
+import asyncio
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
 from app.agents.state import AgentState
+from app.services.cost_tracker import cost_tracker
+from app.services.llm_pool import LLMClientPool, llm_pool
 
 load_dotenv()
 
 
+SYSTEM_PROMPT = (
+    "You are a precise assistant. Answer ONLY using the provided context. "
+    "If the answer is not present, say 'Information not available.'"
+)
+
+
 class ExecutionerNode:
     """
     Executes the LLM call using the model selected by the router.
     This node is COST-AWARE and respects dynamic routing.
+    Clients come from the shared pool, so no client is built per call.
+    Context text is resolved only here, when the prompt is built:
+    `resolve_context(state)` reads the chunks the prune node picked back
+    from the chunk store (the graph passes `app.agents.graph.context_text`).
     """
 
+    def __init__(self, pool: LLMClientPool = None, resolve_context=None):
+        self.pool = pool or llm_pool
+        self.resolve_context = resolve_context
+
+    def build_messages(self, state: AgentState) -> list:
+        # Build prompt using PRUNED context only
+        if self.resolve_context is not None:
+            context = self.resolve_context(state)
+        else:
+            context = state.get("pruned_context")
+            if context is None:
+                context = state["context"]
+        human = f"Context:\n{context}\n\nQuestion:\n{state['prompt']}"
+
+        # On retries only the new chunks are sent, so carry the rejected answer forward
+        if state.get("iteration_count", 0) > 0 and state.get("response"):
+            human = (
+                f"Additional context:\n{context}\n\n"
+                f"An earlier answer, based on other excerpts, was judged insufficient:\n"
+                f"{state['response']}\n\nQuestion:\n{state['prompt']}"
+            )
+
+        # Imported here: langchain_core.messages alone takes ~0.5 s to import
+        from langchain_core.messages import HumanMessage, SystemMessage
+        return [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=human)]
+
     def execute(self, state: AgentState) -> dict:
         print(f"--- EXECUTOR: Using model → {state['chosen_model']} ---")
 
-        # Create LLM dynamically based on routing decision
-        llm = ChatGroq(
-            api_key=os.getenv("GROQ_API_KEY"),
-            model_name=state["chosen_model"]
-        )
+        messages = self.build_messages(state)
 
-        # Build prompt using PRUNED context only
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                "You are a precise assistant. Answer ONLY using the provided context. "
-                "If the answer is not present, say 'Information not available.'"
-            ),
-            (
-                "human",
-                f"Context:\n{state['context']}\n\nQuestion:\n{state['prompt']}"
-            )
-        ])
+        if state.get("stream"):
+            # Token-by-token; LangGraph stream events forward each chunk to the caller.
+            # Adding chunks merges their content and usage metadata.
+            message = None
+            for chunk in self.pool.stream(state["chosen_model"], messages):
+                message = chunk if message is None else message + chunk
+        else:
+            message = self.pool.invoke(state["chosen_model"], messages)
+
+        return self._update(state, messages, message)
+
+    async def aexecute(self, state: AgentState) -> dict:
+        print(f"--- EXECUTOR (async): Using model → {state['chosen_model']} ---")
+
+        # Reading chunk text is file/SQLite work, kept off the event loop
+        messages = await asyncio.to_thread(self.build_messages, state)
+
+        if state.get("stream"):
+            message = None
+            async for chunk in self.pool.astream(state["chosen_model"], messages):
+                message = chunk if message is None else message + chunk
+        else:
+            message = await self.pool.ainvoke(state["chosen_model"], messages)
+
+        return self._update(state, messages, message)
 
-        chain = prompt | llm
-        response = chain.invoke({})
+    @staticmethod
+    def _update(state: AgentState, messages: list, message) -> dict:
+        call = cost_tracker.record_call("execute", state["chosen_model"], messages, message)
 
         # Update only relevant state fields (LangGraph-style)
         return {
-            "response": response.content,
-            "iteration_count": state.get("iteration_count", 0) + 1
+            "response": message.content if message is not None else "",
+            "iteration_count": state.get("iteration_count", 0) + 1,
+            **cost_tracker.accumulate(state, [call])
         }
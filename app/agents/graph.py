@@ -1,88 +1,475 @@
-from langgraph.graph import StateGraph, END
+import asyncio
+import os
+import threading
+import time
+from langgraph.constants import END
 from app.agents.state import AgentState
-from app.services.pruner import SemanticPruner
+from app.services.pruner import SemanticPruner, DEFAULT_TENANT, document_fingerprint
 from app.services.router import ModelRouter
 from app.services.judge import ResponseJudge
 from app.agents.executor import ExecutionerNode
-from app.utils import count_tokens, calculate_cost
+from app.services.response_cache import ResponseCache
+from app.services.retrieval_policy import RetrievalPolicy
+from app.services.context_packer import context_packer
+from app.services.compressor import ExtractiveCompressor
+from app.services.llm_pool import llm_pool
+from app.services.token_counter import token_counter
+from app.services.cost_tracker import cost_tracker
+from app.services.telemetry import telemetry, annotate, timed
+from app.utils import count_tokens
 
 
 # --- Initialize Services ---
-# Make pruner accessible as a module-level variable
-pruner = SemanticPruner()
-router = ModelRouter()
-judge = ResponseJudge()
-executor = ExecutionerNode()
+# Services are built lazily on first use (thread-safe), so importing this
+# module stays cheap; call warm_up() to pay the cost up front instead.
+retrieval_policy = RetrievalPolicy()
 
+_services = {}
+_services_lock = threading.RLock()
 
-def get_pruner():
+
+def _service(name: str, factory):
+    service = _services.get(name)
+    if service is None:
+        with _services_lock:
+            service = _services.get(name)
+            if service is None:
+                service = factory()
+                _services[name] = service
+    return service
+
+
+def get_pruner() -> SemanticPruner:
     """Returns the global pruner instance for use in UI"""
-    return pruner
+    return _service("pruner", SemanticPruner)
+
+
+def get_router() -> ModelRouter:
+    return _service("router", ModelRouter)
+
+
+def _judge_embed(text: str) -> list[float]:
+    # Resolves the pruner only when the judge actually needs an embedding
+    with timed("embed"):
+        return get_pruner().embeddings.embed_query(text)
+
+
+def get_judge() -> ResponseJudge:
+    return _service("judge", lambda: ResponseJudge(embed_fn=_judge_embed))
+
+
+def get_executor() -> ExecutionerNode:
+    return _service("executor", lambda: ExecutionerNode(resolve_context=context_text))
+
+
+def get_response_cache() -> ResponseCache:
+    return _service("response_cache", ResponseCache)
+
+
+def get_compressor() -> ExtractiveCompressor:
+    # Sentence vectors go through the pruner's persistent embedding cache
+    return _service(
+        "compressor",
+        lambda: ExtractiveCompressor(embed_fn=lambda texts: get_pruner().embed_texts(texts))
+    )
+
+
+def warm_up(tenant_ids=(DEFAULT_TENANT,)) -> dict:
+    """
+    Builds every service and touches the expensive parts (embedding model
+    weights, Chroma collections, tokenizer, LLM clients) so the first real
+    query doesn't pay for them. Returns seconds spent per step.
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    pruner = get_pruner()
+    pruner.embed_query("warm up")
+    for tenant_id in tenant_ids:
+        pruner.get_collection(tenant_id)
+    timings["pruner"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    token_counter.get_encoding()
+    timings["tokenizer"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    get_router()
+    get_executor()
+    judge = get_judge()
+    llm_pool.get(judge.model_name)
+    get_response_cache()
+    timings["llm_and_caches"] = time.perf_counter() - started
+
+    print("🔥 Warm-up done: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return timings
 
 
 # -------------------------
 # Graph Nodes
 # -------------------------
 
-def prune_node(state: AgentState) -> dict:
-    print("\n✂️ PRUNER NODE")
+def context_text(state: AgentState) -> str:
+    """
+    This iteration's context. State only holds text that is not in the
+    chunk store; otherwise the chunks in `chunk_refs` are read back from it.
+    """
+    text = state.get("pruned_context")
+    if text is not None:
+        return text
+    return get_pruner().context_text(state.get("chunk_refs") or [], state.get("tenant_id") or DEFAULT_TENANT)
 
-    original_context = state["context"]
 
-    # Token count BEFORE pruning
-    original_tokens = count_tokens(original_context)
+def context_vectors(state: AgentState) -> list:
+    """Cached embeddings of this iteration's chunks (for the judge's grounding check)."""
+    refs = state.get("chunk_refs") or []
+    return get_pruner().chunk_vectors(refs) if refs else []
 
-    # ✅ Corrected call (IMPORTANT)
-    pruned_context = pruner.get_relevant_context(
-        query=state["prompt"],
-        original_context=original_context
-    )
 
-    # Token count AFTER pruning
-    final_tokens = count_tokens(pruned_context)
+def _chunk_ref(hit: dict) -> dict:
+    """Where a sent chunk lives: its id, byte range in the chunk store and place in its document."""
+    offset, length = hit.get("ref") or (None, None)
+    metadata = hit["metadata"]
+    return {
+        "id": hit["id"],
+        "offset": offset,
+        "length": length,
+        "doc_id": metadata.get("doc_id"),
+        "position": metadata.get("position"),
+        "char_start": metadata.get("char_start"),
+        "char_end": metadata.get("char_end")
+    }
 
-    # Cost calculation (simulated)
-    original_cost = calculate_cost(original_tokens, "gpt-4o")
-    optimized_cost = calculate_cost(final_tokens, "gpt-4o-mini")
 
-    money_saved = round(original_cost - optimized_cost, 6)
+def prune_node(state: AgentState) -> dict:
+    print("\n✂️ PRUNER NODE")
 
-    print(f"💰 Money Saved: ${money_saved}")
+    # Ingested documents travel as a handle; only chunk ids and byte ranges are kept in state
+    original_context = state.get("context")
+    tenant_id = state.get("tenant_id") or DEFAULT_TENANT
+    iteration = state.get("iteration_count", 0)
+    sent_ids = state.get("retrieved_ids") or []
+    tokens_sent = state.get("tokens_sent", 0)
+
+    document = state.get("document")
+    if document is None and not original_context:
+        document = get_pruner().document_handle(tenant_id, state.get("doc_ids"))
+
+    # Token count BEFORE pruning (from the registry when only the index is available)
+    if original_context:
+        original_tokens = count_tokens(original_context)
+    else:
+        original_tokens = document["tokens"]
+
+    step = retrieval_policy.step(iteration)
+    print(f"🔎 Retrieval step {iteration + 1}: k={step.k}, neighbors={step.neighbors}, mmr={step.mmr}")
+
+    try:
+        hits = get_pruner().retrieve(
+            query=state["prompt"],
+            k=step.k,
+            tenant_id=tenant_id,
+            doc_ids=state.get("doc_ids"),
+            exclude_ids=sent_ids,
+            neighbors=step.neighbors,
+            mmr=step.mmr
+        )
+    except Exception as e:
+        print(f"⚠️ Pruner fallback: {str(e)}")
+        hits = []
+
+    # Fewer hits than asked for means the corpus has nothing more to give
+    exhausted = len(hits) < step.k
+
+    # This call's window (the smallest one until a model is chosen),
+    # capped by what is left of the budget across all iterations
+    budget = min(
+        context_packer.budget_for(state.get("chosen_model")),
+        retrieval_policy.token_budget - tokens_sent
+    )
+    packed = context_packer.pack(hits, max(budget, 0))
+    kept = packed.chunks
+    pruned_context = None
+    final_tokens = packed.tokens
+
+    # A small document that fits is sent whole rather than as fragments
+    if iteration == 0 and 0 < original_tokens <= budget and (not packed.text or packed.tokens >= original_tokens):
+        if original_context:
+            pruned_context = original_context
+            final_tokens = original_tokens
+            kept = []
+        else:
+            whole = context_packer.pack(get_pruner().document_chunks(tenant_id, state.get("doc_ids")), budget)
+            kept = whole.chunks
+            final_tokens = whole.tokens
+        exhausted = True
+
+    # Nothing retrieved (query failed or index missing) for an over-budget document:
+    # send its beginning cut to the budget rather than no context at all
+    elif iteration == 0 and not packed.chunks and original_tokens > 0 and budget > 0:
+        if original_context:
+            truncated = context_packer.truncate(original_context, budget)
+            pruned_context = truncated.text
+            final_tokens = truncated.tokens
+        else:
+            # Chunks are ranked by position, so the packer keeps the start of the document
+            try:
+                chunks = get_pruner().document_chunks(tenant_id, state.get("doc_ids"))
+                start = context_packer.pack(chunks, budget)
+                kept = start.chunks
+                final_tokens = start.tokens
+                if chunks and not kept:
+                    # Even the first chunk is over budget: cut it down
+                    truncated = context_packer.truncate(chunks[0]["text"], budget)
+                    pruned_context = truncated.text
+                    final_tokens = truncated.tokens
+            except Exception as e:
+                print(f"⚠️ Document chunks unavailable too: {str(e)}")
+        print(f"⚠️ Nothing retrieved, sending the first {final_tokens} of {original_tokens} tokens instead")
+
+    # Token count AFTER pruning (this round only)
+    tokens_sent += final_tokens
+
+    # Savings are measured against one call to the most capable model with the whole
+    # document; real spend accrues as the executor and judge report their calls
+    baseline_cost = state.get("baseline_cost") or cost_tracker.baseline_cost(
+        original_tokens + count_tokens(state["prompt"])
+    )
+    money_saved = round(baseline_cost - (state.get("total_cost") or 0.0), 6)
+
+    print(
+        f"📦 Sending {len(kept)} new chunks ({final_tokens}/{packed.budget} tokens, "
+        f"{packed.dropped} dropped, {tokens_sent} total)"
+    )
+    print(f"💰 Baseline cost: ${baseline_cost:.6f} (saved so far: ${money_saved})")
+    annotate(
+        tokens_in=original_tokens,
+        tokens_out=final_tokens,
+        chunks=len(kept),
+        chunks_dropped=packed.dropped
+    )
 
     return {
-        "context": pruned_context,
+        "document": document,
+        "pruned_context": pruned_context,
+        "retrieved_ids": sent_ids + [hit["id"] for hit in kept],
+        "chunk_refs": [_chunk_ref(hit) for hit in kept],
+        "retrieval_k": step.k,
+        "tokens_sent": tokens_sent,
+        "retrieval_exhausted": exhausted,
+        "context_budget": packed.budget,
+        "context_tokens": final_tokens,
+        "chunks_dropped": packed.dropped,
         "original_token_count": original_tokens,
-        "final_token_count": final_tokens,
+        "final_token_count": tokens_sent,
+        "baseline_cost": baseline_cost,
         "money_saved": money_saved
     }
 
 
+def compress_node(state: AgentState) -> dict:
+    print("\n🗜️ COMPRESSOR NODE")
+
+    context = context_text(state)
+    if not context:
+        return {"compression_ratio": 1.0, "compression_latency_ms": 0.0}
+
+    result = get_compressor().compress(get_pruner().embed_query(state["prompt"]), context)
+    annotate(tokens_in=result.original_tokens, tokens_out=result.tokens)
+
+    # Swap this round's tokens for the compressed count
+    tokens_sent = state.get("tokens_sent", 0) - result.original_tokens + result.tokens
+
+    print(
+        f"🗜️ Kept {result.kept_sentences}/{result.sentences} sentences: "
+        f"{result.original_tokens} → {result.tokens} tokens ({result.ratio:.0%}) in {result.latency_s * 1000:.0f} ms"
+    )
+
+    return {
+        "pruned_context": result.text,
+        "context_tokens": result.tokens,
+        "tokens_sent": tokens_sent,
+        "final_token_count": tokens_sent,
+        "compression_ratio": result.ratio,
+        "compression_latency_ms": result.latency_s * 1000
+    }
+
+
 def route_node(state: AgentState) -> dict:
     print("\n📡 ROUTER NODE")
 
-    chosen_model = router.select_model(state["prompt"])
+    decision = get_router().route(
+        state["prompt"],
+        context_tokens=state.get("context_tokens", 0),
+        query_embedding=get_pruner().embed_query(state["prompt"]),
+        iteration=state.get("iteration_count", 0)
+    )
+    print(f"🧭 {decision.model}: {decision.reason}")
+    annotate(model=decision.model, complexity=round(decision.complexity, 3))
 
     return {
-        "chosen_model": chosen_model
+        "chosen_model": decision.model,
+        "routing_complexity": decision.complexity,
+        "routing_reason": decision.reason
+    }
+
+
+def _document_fingerprint(state: AgentState) -> str:
+    # Raw context is its own document: the tenant's corpus says nothing about it
+    if state.get("context"):
+        return document_fingerprint(state["context"])
+
+    tenant_id = state.get("tenant_id") or DEFAULT_TENANT
+    return (
+        (state.get("document") or {}).get("fingerprint")
+        or get_pruner().corpus_fingerprint(tenant_id, state.get("doc_ids"))
+        or document_fingerprint("")
+    )
+
+
+def _cached_response(state: AgentState) -> dict:
+    """Looks the question up in the response cache; returns the state update on a hit."""
+    fingerprint = state.get("document_fingerprint") or _document_fingerprint(state)
+    query_embedding = get_pruner().embed_query(state["prompt"])
+
+    cached = get_response_cache().get(
+        fingerprint,
+        state["prompt"],
+        state["chosen_model"],
+        query_embedding=query_embedding
+    )
+
+    update = {
+        "document_fingerprint": fingerprint,
+        "cache_hit": None,
+        "cache_stats": get_response_cache().stats()
     }
 
+    if cached:
+        entry, tier = cached
+        print(f"⚡ Response cache hit ({tier}), skipping LLM call")
+        annotate(cache_hit=tier)
+        update.update({
+            "response": entry["response"],
+            "iteration_count": state.get("iteration_count", 0) + 1,
+            "cache_hit": tier,
+            "cached_quality_score": entry["quality_score"]
+        })
+
+    return update
+
+
+def _judge_update(state: AgentState, verdict) -> dict:
+    query_embedding = get_pruner().embed_query(state["prompt"])
+
+    # Only answers the judge model accepted are worth serving again
+    if verdict.score >= 7 and verdict.tier != "heuristic":
+        get_response_cache().put(
+            state["document_fingerprint"],
+            state["prompt"],
+            state["chosen_model"],
+            state["response"],
+            quality_score=verdict.score,
+            query_embedding=query_embedding
+        )
+
+    # Judge-model verdicts are training data for the router. Heuristic rejects
+    # (refusals, ungrounded answers) mostly mean retrieval missed, not that the
+    # model was too weak, so they would teach it to escalate for nothing
+    if verdict.tier != "heuristic":
+        get_router().record_outcome(query_embedding, state["chosen_model"], verdict.score)
+
+    annotate(judge_tier=verdict.tier, cache_hit="judge_cache" if verdict.tier == "cache" else None)
+    update = {
+        "quality_score": verdict.score,
+        "judge_tier": verdict.tier
+    }
+    if verdict.call:
+        update.update(cost_tracker.accumulate(state, [verdict.call]))
+    return update
+
+
+def _reuse_cached_score(state: AgentState):
+    # Cached answers were already judged when they were stored
+    if state.get("cache_hit") and state.get("cached_quality_score") is not None:
+        score = state["cached_quality_score"]
+        print(f"🧪 JUDGE SCORE (cached): {score}/10")
+        annotate(judge_tier="response_cache", cache_hit="response_cache")
+        return {
+            "quality_score": score,
+            "judge_tier": "response_cache"
+        }
+    return None
+
 
 def execute_node(state: AgentState) -> dict:
     print("\n🤖 EXECUTOR NODE")
-    return executor.execute(state)
+
+    update = _cached_response(state)
+    if update["cache_hit"]:
+        return update
+
+    result = get_executor().execute(state)
+    result.update(update)
+    return result
 
 
 def judge_node(state: AgentState) -> dict:
     print("\n🧪 JUDGE NODE")
 
-    score = judge.evaluate_response(
+    cached = _reuse_cached_score(state)
+    if cached:
+        return cached
+
+    verdict = get_judge().evaluate(
         state["prompt"],
-        state["response"]
+        state["response"],
+        context=context_text(state),
+        context_vectors=context_vectors(state)
     )
+    return _judge_update(state, verdict)
 
-    return {
-        "quality_score": score
-    }
+
+# -------------------------
+# Async Graph Nodes
+# -------------------------
+# Same logic as above for `ainvoke`/`astream`. Embedding, Chroma and SQLite
+# work is pushed to threads; LLM calls await the shared client pool.
+
+async def aprune_node(state: AgentState) -> dict:
+    return await asyncio.to_thread(prune_node, state)
+
+
+async def acompress_node(state: AgentState) -> dict:
+    return await asyncio.to_thread(compress_node, state)
+
+
+async def aexecute_node(state: AgentState) -> dict:
+    print("\n🤖 EXECUTOR NODE (async)")
+
+    update = await asyncio.to_thread(_cached_response, state)
+    if update["cache_hit"]:
+        return update
+
+    result = await get_executor().aexecute(state)
+    result.update(update)
+    return result
+
+
+async def ajudge_node(state: AgentState) -> dict:
+    print("\n🧪 JUDGE NODE (async)")
+
+    cached = _reuse_cached_score(state)
+    if cached:
+        return cached
+
+    verdict = await get_judge().aevaluate(
+        state["prompt"],
+        state["response"],
+        context=await asyncio.to_thread(context_text, state),
+        context_vectors=await asyncio.to_thread(context_vectors, state)
+    )
+    return await asyncio.to_thread(_judge_update, state, verdict)
 
 
 # -------------------------
@@ -100,7 +487,11 @@ def decide_next_step(state: AgentState):
         print("⚠️ Max retries reached. Ending.")
         return END
 
-    print("🔁 Retrying with improved context/model...")
+    if not retrieval_policy.has_more(state):
+        print("🛑 No new context left within budget. Ending.")
+        return END
+
+    print("🔁 Retrying with a wider search radius...")
     return "prune"
 
 
@@ -108,17 +499,39 @@ def decide_next_step(state: AgentState):
 # Build LangGraph
 # -------------------------
 
-def build_agent_graph():
+def build_agent_graph(async_mode: bool = False, compress: bool = None):
+    """
+    Compiles the agent graph. With `async_mode=True` the prune, execute and
+    judge nodes are coroutines, so the graph is meant to be driven with
+    `ainvoke`/`astream` and many requests can share one event loop.
+    `compress` adds sentence-level compression between prune and route
+    (defaults to the TOKEN_DIET_COMPRESSION env var).
+    """
+    # langgraph.graph pulls in most of langchain_core; only load it when a graph is built
+    from langgraph.graph import StateGraph
+
+    if compress is None:
+        compress = os.getenv("TOKEN_DIET_COMPRESSION", "0") == "1"
+
     graph = StateGraph(AgentState)
 
-    graph.add_node("prune", prune_node)
-    graph.add_node("route", route_node)
-    graph.add_node("execute", execute_node)
-    graph.add_node("judge", judge_node)
+    # Every node runs inside a telemetry span (see app.services.telemetry)
+    def add_node(name, node):
+        graph.add_node(name, telemetry.instrument(name)(node))
+
+    add_node("prune", aprune_node if async_mode else prune_node)
+    add_node("route", route_node)
+    add_node("execute", aexecute_node if async_mode else execute_node)
+    add_node("judge", ajudge_node if async_mode else judge_node)
 
     graph.set_entry_point("prune")
 
-    graph.add_edge("prune", "route")
+    if compress:
+        add_node("compress", acompress_node if async_mode else compress_node)
+        graph.add_edge("prune", "compress")
+        graph.add_edge("compress", "route")
+    else:
+        graph.add_edge("prune", "route")
     graph.add_edge("route", "execute")
     graph.add_edge("execute", "judge")
 
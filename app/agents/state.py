@@ -1,22 +1,96 @@
-from typing import TypedDict, Optional
+import uuid
+from typing import TypedDict, Optional, List
 
 class AgentState(TypedDict):
     # 1. Input Data
     prompt: str             # The user's original query
-    context: Optional[str]  # Any large text provided (e.g., a PDF content)
+    context: Optional[str]  # Raw text from callers that did not ingest it; prefer `document`
+    tenant_id: str          # Whose corpus to search (one collection per tenant)
+    doc_ids: Optional[List[str]]  # Documents to search; None = tenant's whole corpus
+    document: Optional[dict]        # Handle of the searched documents (SemanticPruner.document_handle)
     
     # 2. Processing Data
     optimized_prompt: str   # The prompt after pruning filler words
-    chosen_model: str       # "gpt-4o-mini" or "gpt-4o"
+    chosen_model: str       # Model picked by the router (see config/models.json)
+    routing_complexity: float       # Router's estimate that the query needs a stronger tier
+    routing_reason: str             # Why the router picked chosen_model
+    pruned_context: Optional[str]   # Context text only when it isn't in the chunk store (caller
+                                    # text, compressed output); None = resolve `chunk_refs`
+
+    # 2b. Retrieval escalation (grows on every retry)
+    retrieval_k: int                # Chunks requested this iteration
+    retrieved_ids: List[str]        # Chunk ids already sent to the executor
+    chunk_refs: List[dict]          # This iteration's chunks: id, chunk-store byte range, position
+    tokens_sent: int                # Context tokens sent across all iterations
+    retrieval_exhausted: bool       # Nothing new left within the token budget
+
+    # 2c. Context packing (this iteration)
+    context_budget: int             # Token budget the packed context had to fit
+    context_tokens: int             # Tokens actually sent
+    chunks_dropped: int             # Duplicate, overlapping or over-budget chunks left out
+    compression_ratio: float        # Compressed / packed tokens (optional compress node)
+    compression_latency_ms: float   # Time spent compressing this iteration
     
     # 3. Output Data
     response: str           # The AI's generated answer
     quality_score: int      # 1 to 10 score from the Judge
+    judge_tier: str         # Which judge tier decided: "heuristic", "cache", "llm" or "response_cache"
     
     # 4. Metrics (The "Value" of your project)
     original_token_count: int
     final_token_count: int
-    money_saved: float      # Calculated as (Original Cost - New Cost)
+    money_saved: float      # baseline_cost - total_cost
+
+    # 4a. Cost accounting (prices from config/models.json)
+    baseline_cost: float            # Whole document in one call to the most capable model
+    total_cost: float               # Actual spend so far, all LLM calls
+    cost_by_node: dict              # node -> USD
+    llm_calls: List[dict]           # One priced record per LLM call (node, model, tokens, cost)
     
+    # 4b. Response cache
+    document_fingerprint: str       # Content id of the searched corpus (cache key part)
+    cache_hit: Optional[str]        # "exact", "semantic" or None
+    cached_quality_score: Optional[int]  # Judge score stored with the cached answer
+    cache_stats: dict               # Process-wide hit/miss counters
+
+    # 4c. Instrumentation (see app.services.telemetry)
+    trace_id: str                   # Shared by every node span of this run
+    trace: List[dict]               # One measured record per node execution, incl. state size
+
     # 5. Control Flow
-    iteration_count: int    # To prevent infinite loops (Self-correction count)
\ No newline at end of file
+    stream: bool            # Executor streams tokens (see app.agents.streaming)
+    iteration_count: int    # To prevent infinite loops (Self-correction count)
+
+def initial_state(
+    prompt: str,
+    context: Optional[str] = None,
+    tenant_id: str = "default",
+    doc_ids: Optional[List[str]] = None,
+    document: Optional[dict] = None
+) -> AgentState:
+    """
+    Starting state for one agent run. Ingested documents are passed by
+    `doc_ids` (and optionally their `document` handle) and never as text;
+    `context` is only for raw text that was not ingested.
+    """
+    return {
+        "prompt": prompt,
+        "context": context,
+        "tenant_id": tenant_id,
+        "doc_ids": doc_ids,
+        "document": document,
+        "response": "",
+        "quality_score": 0,
+        "chosen_model": "",
+        "original_token_count": 0,
+        "final_token_count": 0,
+        "money_saved": 0.0,
+        "total_cost": 0.0,
+        "llm_calls": [],
+        "iteration_count": 0,
+        "retrieved_ids": [],
+        "chunk_refs": [],
+        "tokens_sent": 0,
+        "trace_id": uuid.uuid4().hex,
+        "trace": []
+    }
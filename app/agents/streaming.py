@@ -0,0 +1,93 @@
+import asyncio
+import queue
+import threading
+from typing import Iterator
+
+# Only tokens produced inside these nodes are forwarded to the caller
+STREAMED_NODES = {"execute"}
+GRAPH_NODES = {"prune", "compress", "route", "execute", "judge"}
+
+_DONE = object()
+
+
+async def astream_agent(agent, initial_state: dict):
+    """
+    Async version of `stream_agent`, built on LangGraph's stream events.
+    Yields ("node", name), ("token", text) and finally ("final", state).
+    """
+    root_run_id = None
+    final_state = None
+
+    initial_state = {**initial_state, "stream": True}
+
+    async for event in agent.astream_events(initial_state, version="v2"):
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+
+        if root_run_id is None and kind == "on_chain_start":
+            root_run_id = event["run_id"]
+
+        elif kind == "on_chain_start" and event["name"] in GRAPH_NODES and node == event["name"]:
+            yield "node", event["name"]
+
+        elif kind == "on_chat_model_stream" and node in STREAMED_NODES:
+            text = event["data"]["chunk"].content
+            if text:
+                yield "token", text
+
+        elif kind == "on_chain_end" and event["run_id"] == root_run_id:
+            final_state = event["data"].get("output")
+
+    yield "final", final_state
+
+
+def stream_agent(agent, initial_state: dict) -> Iterator[tuple]:
+    """
+    Runs the graph and yields executor tokens as they arrive, for sync callers
+    such as Streamlit. The judge still scores the fully assembled answer,
+    because it only runs once the execute node has finished.
+
+    Yields ("node", name) when a node starts, ("token", text) for each
+    executor token, and ("final", state) once the graph ends.
+    """
+    events = queue.Queue(maxsize=1024)
+    # Set once the caller stops consuming (finished, raised or closed the generator early)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Waits for room in the queue, but not for a consumer that has gone away
+        while not stop.is_set():
+            try:
+                events.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def pump():
+        stream = astream_agent(agent, initial_state)
+        try:
+            async for item in stream:
+                if not put(item):
+                    break
+        except BaseException as e:
+            put(("error", e))
+        finally:
+            await stream.aclose()
+            put(_DONE)
+
+    worker = threading.Thread(target=lambda: asyncio.run(pump()), name="stream_agent", daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            item = events.get()
+            if item is _DONE:
+                break
+            if item[0] == "error":
+                raise item[1]
+            yield item
+    finally:
+        stop.set()
+
+    worker.join()
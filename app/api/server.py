@@ -0,0 +1,363 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from app.agents.graph import build_agent_graph, get_pruner, get_response_cache, retrieval_policy, warm_up
+from app.agents.state import initial_state
+from app.agents.streaming import astream_agent
+from app.services.pruner import DEFAULT_TENANT
+from app.services.telemetry import telemetry
+from app.services.token_counter import token_counter
+from app.utils.file_loader import iter_pages_from_file
+
+
+MAX_IN_FLIGHT = int(os.getenv("TOKEN_DIET_MAX_IN_FLIGHT", "64"))
+MAX_QUEUED = int(os.getenv("TOKEN_DIET_MAX_QUEUED", "256"))
+REQUEST_TIMEOUT = float(os.getenv("TOKEN_DIET_REQUEST_TIMEOUT", "60"))
+BATCH_MAX_SIZE = int(os.getenv("TOKEN_DIET_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("TOKEN_DIET_BATCH_MAX_WAIT_MS", "10"))
+
+
+class QueryRequest(BaseModel):
+    prompt: str
+    tenant_id: str = DEFAULT_TENANT
+    doc_ids: Optional[List[str]] = None
+
+
+class Metrics:
+    """Process-local counters exposed on /metrics."""
+
+    def __init__(self):
+        self.requests = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_latency_s": round(self.latency_total / self.completed, 4) if self.completed else 0.0,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0
+        }
+
+
+class AdmissionControl:
+    """
+    Backpressure: at most `max_in_flight` requests run at once and at most
+    `max_queued` wait for a slot; anything beyond that is rejected with 503
+    so a load balancer can send it elsewhere.
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, metrics: Metrics):
+        self.max_queued = max_queued
+        self.metrics = metrics
+        self.in_flight = 0
+        self.queued = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    def check(self):
+        """Rejects with 503 when the wait queue is full."""
+        if self.queued >= self.max_queued:
+            self.metrics.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, retry later")
+
+    async def __aenter__(self):
+        self.check()
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self._slots.release()
+
+
+class QueryBatcher:
+    """
+    Micro-batches first-round retrieval for concurrent queries.
+
+    Queries arriving within `max_wait_ms` of each other (up to `max_size`)
+    are grouped by tenant and document filter, and each group is embedded
+    in one forward pass and looked up with one multi-vector Chroma query.
+    The graph's prune node then picks the prefetched hits up.
+    """
+
+    def __init__(self, pruner, k: int, max_size: int, max_wait_ms: float, metrics: Metrics):
+        self.pruner = pruner
+        self.k = k
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = metrics
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, prompt: str, tenant_id: str, doc_ids):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, tenant_id, doc_ids, future))
+        await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.max_wait
+            while len(batch) < self.max_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for prompt, tenant_id, doc_ids, future in batch:
+                key = (tenant_id, tuple(sorted(doc_ids)) if doc_ids else None)
+                groups.setdefault(key, []).append((prompt, future))
+
+            for (tenant_id, doc_ids), items in groups.items():
+                try:
+                    await asyncio.to_thread(
+                        self.pruner.prefetch,
+                        [prompt for prompt, _ in items],
+                        k=self.k,
+                        tenant_id=tenant_id,
+                        doc_ids=list(doc_ids) if doc_ids else None
+                    )
+                except Exception as e:
+                    # The graph will simply retrieve on its own
+                    print(f"⚠️ Batched prefetch failed: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_result(None)
+
+            self.metrics.batches += 1
+            self.metrics.batched_queries += len(batch)
+
+
+class _UploadAdapter:
+    """Gives a FastAPI UploadFile the `.type`/`.read()` shape the file loader expects."""
+
+    def __init__(self, upload: UploadFile):
+        self.type = upload.content_type
+        self.name = upload.filename
+        self._file = upload.file
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int):
+        self._file.seek(offset)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models and clients are loaded once per worker, not per request
+    await asyncio.to_thread(warm_up)
+    app.state.metrics = Metrics()
+    app.state.pruner = get_pruner()
+    app.state.agent = build_agent_graph(async_mode=True)
+    app.state.admission = AdmissionControl(MAX_IN_FLIGHT, MAX_QUEUED, app.state.metrics)
+    app.state.batcher = QueryBatcher(
+        app.state.pruner,
+        k=retrieval_policy.step(0).k,
+        max_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        metrics=app.state.metrics
+    )
+    app.state.batcher.start()
+    yield
+    await app.state.batcher.stop()
+
+
+app = FastAPI(title="Token-Diet Agent", lifespan=lifespan)
+
+
+def _summary(final_state: dict) -> dict:
+    return {
+        "response": final_state.get("response", ""),
+        "quality_score": final_state.get("quality_score"),
+        "judge_tier": final_state.get("judge_tier"),
+        "chosen_model": final_state.get("chosen_model"),
+        "iteration_count": final_state.get("iteration_count"),
+        "original_token_count": final_state.get("original_token_count"),
+        "final_token_count": final_state.get("final_token_count"),
+        "context_budget": final_state.get("context_budget"),
+        "chunks_dropped": final_state.get("chunks_dropped"),
+        "money_saved": final_state.get("money_saved"),
+        "total_cost": final_state.get("total_cost"),
+        "cost_by_node": final_state.get("cost_by_node"),
+        "cache_hit": final_state.get("cache_hit"),
+        "trace_id": final_state.get("trace_id"),
+        "trace": final_state.get("trace")
+    }
+
+
+@app.post("/ingest")
+async def ingest(
+    file: UploadFile = File(...),
+    tenant_id: str = Form(DEFAULT_TENANT),
+    doc_id: Optional[str] = Form(None)
+):
+    if file.content_type not in ("application/pdf", "text/plain"):
+        raise HTTPException(status_code=415, detail="Only PDF and TXT files are supported")
+
+    doc_id = doc_id or file.filename
+    stats = await asyncio.to_thread(
+        app.state.pruner.ingest_stream,
+        iter_pages_from_file(_UploadAdapter(file)),
+        doc_id=doc_id,
+        tenant_id=tenant_id,
+        name=file.filename
+    )
+    return stats
+
+
+@app.get("/documents")
+async def documents(tenant_id: str = DEFAULT_TENANT):
+    return app.state.pruner.list_documents(tenant_id)
+
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    metrics = app.state.metrics
+    metrics.requests += 1
+    started = time.perf_counter()
+
+    async with app.state.admission:
+        try:
+            await asyncio.wait_for(
+                app.state.batcher.submit(request.prompt, request.tenant_id, request.doc_ids),
+                REQUEST_TIMEOUT
+            )
+            final_state = await asyncio.wait_for(
+                app.state.agent.ainvoke(
+                    initial_state(request.prompt, tenant_id=request.tenant_id, doc_ids=request.doc_ids)
+                ),
+                REQUEST_TIMEOUT - (time.perf_counter() - started)
+            )
+        except asyncio.TimeoutError:
+            metrics.timeouts += 1
+            raise HTTPException(status_code=504, detail="Request timed out")
+        except Exception as e:
+            metrics.errors += 1
+            raise HTTPException(status_code=500, detail=str(e))
+
+    metrics.completed += 1
+    metrics.latency_total += time.perf_counter() - started
+    return _summary(final_state)
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    metrics = app.state.metrics
+    metrics.requests += 1
+    started = time.perf_counter()
+    deadline = asyncio.get_running_loop().time() + REQUEST_TIMEOUT
+
+    # A saturated worker answers 503 before the stream starts
+    admission = app.state.admission
+    admission.check()
+
+    async def events():
+        stream = None
+        try:
+            # The slot is held while the generator runs and released however it ends,
+            # including when the client disconnects and the generator is closed
+            async with admission:
+                async with asyncio.timeout_at(deadline):
+                    await app.state.batcher.submit(request.prompt, request.tenant_id, request.doc_ids)
+
+                state = initial_state(request.prompt, tenant_id=request.tenant_id, doc_ids=request.doc_ids)
+                stream = astream_agent(app.state.agent, state)
+                while True:
+                    # The deadline covers waiting for each event; yields stay outside the
+                    # timeout so it can never fire while the response is being sent
+                    async with asyncio.timeout_at(deadline):
+                        event = await anext(stream, None)
+                    if event is None:
+                        break
+
+                    kind, payload = event
+                    if kind == "final":
+                        metrics.completed += 1
+                        metrics.latency_total += time.perf_counter() - started
+                        yield json.dumps({"type": "final", **_summary(payload or {})}) + "\n"
+                    elif kind == "token":
+                        yield json.dumps({"type": "token", "text": payload}) + "\n"
+                    else:
+                        yield json.dumps({"type": kind, "name": payload}) + "\n"
+        except TimeoutError:
+            metrics.timeouts += 1
+            yield json.dumps({"type": "error", "detail": "Request timed out"}) + "\n"
+        except HTTPException as e:
+            # The queue filled up between the check above and taking a slot
+            yield json.dumps({"type": "error", "detail": e.detail}) + "\n"
+        except Exception as e:
+            metrics.errors += 1
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+        finally:
+            if stream is not None:
+                await stream.aclose()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "server": {
+            **app.state.metrics.snapshot(),
+            "in_flight": app.state.admission.in_flight,
+            "queued": app.state.admission.queued
+        },
+        "response_cache": get_response_cache().stats(),
+        "token_counter": token_counter.stats()
+    }
+
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # Per-node durations, tokens, cache hits and embedding/Chroma time
+    return telemetry.prometheus()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "app.api.server:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1"))
+    )
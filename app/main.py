@@ -42,6 +42,8 @@ initial_state = {
     "response": "",
     "quality_score": 0,
     "iteration_count": 0,
+    "retrieved_ids": [],
+    "tokens_sent": 0,
     "chosen_model": "",
     "original_token_count": 0,
     "final_token_count": 0,
@@ -0,0 +1,125 @@
+import mmap
+import os
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process writers only
+    fcntl = None
+
+
+class ChunkStore:
+    """
+    Append-only, content-addressed store for chunk text, shared by every
+    tenant, document and worker process.
+
+    Text is written once per chunk hash, as UTF-8, to the end of
+    `chunks.bin`; `index.sqlite` maps each hash to its (offset, length)
+    byte range. Readers memory-map the data file, so the OS page cache
+    keeps one copy of the text however many workers serve it, and a
+    reference to a chunk is two integers instead of its text. Vectors stay
+    in the vector index (NumPy's memory-mapped `vectors.npy` or Chroma).
+
+    Writers from several processes take an exclusive `flock` on the data
+    file while appending. Nothing is ever rewritten or deleted in place.
+    """
+
+    def __init__(self, path: str = "./db/chunks"):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._fd = os.open(os.path.join(path, "chunks.bin"), os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._map = None
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " hash TEXT PRIMARY KEY,"
+            " offset INTEGER NOT NULL,"
+            " length INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    # -------------------------
+    # Writes
+    # -------------------------
+
+    def put_many(self, chunks: dict) -> dict:
+        """Stores {hash: text}, skipping hashes already present; returns {hash: (offset, length)}."""
+        if not chunks:
+            return {}
+
+        with self._lock:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                # Re-check under the file lock: another worker may have just written them
+                refs = self._locate(list(chunks))
+                missing = [chunk_hash for chunk_hash in chunks if chunk_hash not in refs]
+                if not missing:
+                    return refs
+
+                offset = os.fstat(self._fd).st_size
+                payload, rows = [], []
+                for chunk_hash in missing:
+                    data = chunks[chunk_hash].encode("utf-8")
+                    payload.append(data)
+                    rows.append((chunk_hash, offset, len(data)))
+                    refs[chunk_hash] = (offset, len(data))
+                    offset += len(data)
+
+                os.write(self._fd, b"".join(payload))
+                os.fsync(self._fd)
+                self._conn.executemany("INSERT OR IGNORE INTO chunks VALUES (?, ?, ?)", rows)
+                self._conn.commit()
+                return refs
+            finally:
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # -------------------------
+    # Reads
+    # -------------------------
+
+    def _locate(self, hashes: list[str]) -> dict:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT hash, offset, length FROM chunks WHERE hash IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            found.update((chunk_hash, (offset, length)) for chunk_hash, offset, length in rows)
+        return found
+
+    def locate(self, hashes: list[str]) -> dict:
+        """Returns {hash: (offset, length)} for every hash in the store."""
+        with self._lock:
+            return self._locate(hashes)
+
+    def _mapped(self, end: int) -> mmap.mmap:
+        # Remap once the file has grown past the current mapping (or on first read)
+        with self._lock:
+            if self._map is None or len(self._map) < end:
+                size = os.fstat(self._fd).st_size
+                if size < end:
+                    raise ValueError(f"Chunk range ends at byte {end}, past the end of the store ({size})")
+                # The old mapping is left to the GC: other threads may still be slicing it
+                self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+            return self._map
+
+    def read(self, offset: int, length: int) -> str:
+        """Text of one (offset, length) byte range, straight from the mapped file."""
+        if length == 0:
+            return ""
+        return self._mapped(offset + length)[offset:offset + length].decode("utf-8")
+
+    def get_many(self, hashes: list[str]) -> dict:
+        """Returns {hash: text} for every hash in the store."""
+        return {chunk_hash: self.read(*ref) for chunk_hash, ref in self.locate(hashes).items()}
+
+    def size(self) -> int:
+        """Bytes of text stored."""
+        return os.fstat(self._fd).st_size
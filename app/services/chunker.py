@@ -0,0 +1,276 @@
+import os
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from app.services.token_counter import DEFAULT_MODEL, token_counter
+
+
+@dataclass
+class Chunk:
+    """A slice of a document plus where it sits in the original text."""
+    text: str
+    char_start: int
+    char_end: int
+    token_start: int
+    token_end: int
+
+    @property
+    def token_count(self) -> int:
+        return self.token_end - self.token_start
+
+    def shifted(self, chars: int, tokens: int) -> "Chunk":
+        return Chunk(
+            text=self.text,
+            char_start=self.char_start + chars,
+            char_end=self.char_end + chars,
+            token_start=self.token_start + tokens,
+            token_end=self.token_end + tokens
+        )
+
+
+class Chunker(ABC):
+    """
+    Base chunking strategy.
+
+    Subclasses implement `split` for a complete string; `stream` turns that
+    into an incremental splitter for page streams by holding back the last
+    (possibly incomplete) chunk until more text arrives. Tokens are counted
+    with the same encoder the cost model uses.
+    """
+
+    name = "base"
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        self.model = model
+
+    @property
+    def encoding(self):
+        return token_counter.get_encoding(self.model)
+
+    def signature(self) -> str:
+        """Identifies the strategy and its settings; a change forces re-ingestion."""
+        params = ",".join(f"{key}={value}" for key, value in sorted(self._params().items()))
+        return f"{self.name}({params})"
+
+    def _params(self) -> dict:
+        return {"model": self.model}
+
+    @abstractmethod
+    def split(self, text: str) -> list[Chunk]:
+        """Chunks of a complete text, in order, with offsets into it."""
+
+    def stream(self, pages: Iterable[str]) -> Iterator[Chunk]:
+        buffer = ""
+        char_base = 0
+        token_base = 0
+
+        for page in pages:
+            buffer += page
+            chunks = self.split(buffer)
+            if len(chunks) < 2:
+                continue
+
+            for chunk in chunks[:-1]:
+                yield chunk.shifted(char_base, token_base)
+
+            # Everything before the held-back chunk is final
+            cut = chunks[-1].char_start
+            buffer = buffer[cut:]
+            char_base += cut
+            token_base += chunks[-1].token_start
+
+        for chunk in self.split(buffer):
+            yield chunk.shifted(char_base, token_base)
+
+
+class FixedCharChunker(Chunker):
+    """Legacy behaviour: cut every `chunk_size` characters."""
+
+    name = "fixed"
+
+    def __init__(self, chunk_size: int = 800, model: str = DEFAULT_MODEL):
+        super().__init__(model)
+        self.chunk_size = chunk_size
+
+    def _params(self) -> dict:
+        return {"chunk_size": self.chunk_size, "model": self.model}
+
+    def split(self, text: str) -> list[Chunk]:
+        pieces = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        counts = token_counter.count_batch(pieces, self.model)
+
+        chunks = []
+        token_start = 0
+        for i, (piece, count) in enumerate(zip(pieces, counts)):
+            char_start = i * self.chunk_size
+            chunks.append(Chunk(piece, char_start, char_start + len(piece), token_start, token_start + count))
+            token_start += count
+        return chunks
+
+
+class TokenChunker(Chunker):
+    """
+    Token-budgeted windows of `max_tokens`, optionally overlapping by
+    `overlap` tokens. Chunk text is sliced from the original string, so
+    char offsets are exact.
+    """
+
+    name = "token"
+
+    def __init__(self, max_tokens: int = 200, overlap: int = 0, model: str = DEFAULT_MODEL):
+        super().__init__(model)
+        if not 0 <= overlap < max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+
+    def _params(self) -> dict:
+        return {"max_tokens": self.max_tokens, "overlap": self.overlap, "model": self.model}
+
+    def split(self, text: str) -> list[Chunk]:
+        if not text:
+            return []
+
+        tokens = self.encoding.encode_ordinary(text)
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        offsets.append(len(text))
+
+        chunks = []
+        stride = self.max_tokens - self.overlap
+        for start in range(0, len(tokens), stride):
+            end = min(start + self.max_tokens, len(tokens))
+            char_start, char_end = offsets[start], offsets[end]
+            if char_end > char_start:
+                chunks.append(Chunk(text[char_start:char_end], char_start, char_end, start, end))
+            if end == len(tokens):
+                break
+        return chunks
+
+
+class SlidingWindowChunker(TokenChunker):
+    """Token windows with a configurable overlap so facts near a boundary appear whole in one chunk."""
+
+    name = "sliding"
+
+    def __init__(self, max_tokens: int = 200, overlap: int = 50, model: str = DEFAULT_MODEL):
+        super().__init__(max_tokens=max_tokens, overlap=overlap, model=model)
+
+
+class SentenceChunker(Chunker):
+    """
+    Packs whole sentences into chunks of at most `max_tokens`, preferring
+    to break at paragraph boundaries once a chunk is reasonably full.
+    Sentences longer than the budget fall back to token windows.
+    """
+
+    name = "sentence"
+
+    PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+    SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+    def __init__(self, max_tokens: int = 200, overlap_sentences: int = 0, model: str = DEFAULT_MODEL):
+        super().__init__(model)
+        self.max_tokens = max_tokens
+        self.overlap_sentences = overlap_sentences
+        self._fallback = TokenChunker(max_tokens=max_tokens, model=model)
+
+    def _params(self) -> dict:
+        return {
+            "max_tokens": self.max_tokens,
+            "overlap_sentences": self.overlap_sentences,
+            "model": self.model
+        }
+
+    @classmethod
+    def sentence_spans(cls, text: str) -> list[tuple]:
+        """(start, end, starts_paragraph) sentence spans that cover the text end to end."""
+        boundaries = {0: True}
+        for match in cls.PARAGRAPH_BREAK.finditer(text):
+            boundaries[match.end()] = True
+        for match in cls.SENTENCE_END.finditer(text):
+            boundaries.setdefault(match.end(), False)
+
+        starts = sorted(b for b in boundaries if b < len(text))
+        return [
+            (start, end, boundaries[start])
+            for start, end in zip(starts, starts[1:] + [len(text)])
+        ]
+
+    def split(self, text: str) -> list[Chunk]:
+        if not text:
+            return []
+
+        units = self.sentence_spans(text)
+        counts = token_counter.count_batch([text[s:e] for s, e, _ in units], self.model)
+
+        # Oversized sentences are broken into token windows first
+        spans = []
+        token_pos = 0
+        for (start, end, paragraph), count in zip(units, counts):
+            if count <= self.max_tokens:
+                spans.append((start, end, token_pos, token_pos + count, paragraph))
+            else:
+                for i, piece in enumerate(self._fallback.split(text[start:end])):
+                    spans.append((
+                        start + piece.char_start,
+                        start + piece.char_end,
+                        token_pos + piece.token_start,
+                        token_pos + piece.token_end,
+                        paragraph and i == 0
+                    ))
+            token_pos += count
+
+        chunks = []
+        current = []
+        current_tokens = 0
+
+        def flush():
+            chunks.append(Chunk(
+                text[current[0][0]:current[-1][1]],
+                current[0][0],
+                current[-1][1],
+                current[0][2],
+                current[-1][3]
+            ))
+
+        for span in spans:
+            span_tokens = span[3] - span[2]
+            paragraph_break = span[4] and current_tokens >= self.max_tokens // 2
+            if current and (current_tokens + span_tokens > self.max_tokens or paragraph_break):
+                flush()
+                current = current[-self.overlap_sentences:] if self.overlap_sentences else []
+                current_tokens = sum(s[3] - s[2] for s in current)
+                # Overlap must never push the next chunk over budget on its own
+                while current and current_tokens + span_tokens > self.max_tokens:
+                    current_tokens -= current[0][3] - current[0][2]
+                    current = current[1:]
+            current.append(span)
+            current_tokens += span_tokens
+
+        if current:
+            flush()
+        return chunks
+
+
+CHUNKERS = {
+    FixedCharChunker.name: FixedCharChunker,
+    TokenChunker.name: TokenChunker,
+    SlidingWindowChunker.name: SlidingWindowChunker,
+    SentenceChunker.name: SentenceChunker
+}
+
+
+def get_chunker(strategy: str = None, **kwargs) -> Chunker:
+    """
+    Builds a chunker by strategy name ("fixed", "token", "sliding", "sentence").
+    Defaults to TOKEN_DIET_CHUNKER, or "sentence" when unset.
+    """
+    strategy = strategy or os.getenv("TOKEN_DIET_CHUNKER", SentenceChunker.name)
+    try:
+        return CHUNKERS[strategy](**kwargs)
+    except KeyError:
+        raise ValueError(
+            f"Unknown chunker '{strategy}'. Choose one of: {', '.join(CHUNKERS)}"
+        ) from None
@@ -0,0 +1,113 @@
+import os
+import time
+from dataclasses import dataclass
+import numpy as np
+from app.services.chunker import SentenceChunker
+from app.utils import count_tokens, count_tokens_batch
+
+
+@dataclass
+class CompressedContext:
+    text: str
+    original_tokens: int
+    tokens: int
+    sentences: int
+    kept_sentences: int
+    latency_s: float
+
+    @property
+    def ratio(self) -> float:
+        """Compressed / original tokens (1.0 = nothing removed)."""
+        return self.tokens / self.original_tokens if self.original_tokens else 1.0
+
+
+class ExtractiveCompressor:
+    """
+    Sentence-level extractive compression of retrieved context.
+
+    The context is split into sentences, every sentence is scored against
+    the query with one batched embedding call and a NumPy cosine, and only
+    sentences scoring at least `threshold` are kept (best first, up to
+    `target_ratio` of the original tokens when set). The `min_sentences`
+    best sentences are always kept. Survivors stay in their original order.
+    """
+
+    def __init__(
+        self,
+        embed_fn,
+        threshold: float = None,
+        target_ratio: float = None,
+        min_sentences: int = 2,
+        model: str = "gpt-4o"
+    ):
+        # embed_fn: list of texts -> list of vectors
+        self.embed_fn = embed_fn
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv("TOKEN_DIET_COMPRESSION_THRESHOLD", "0.3")
+        )
+        target = os.getenv("TOKEN_DIET_COMPRESSION_TARGET")
+        self.target_ratio = target_ratio if target_ratio is not None else (float(target) if target else None)
+        self.min_sentences = min_sentences
+        self.model = model
+
+    def compress(self, query_embedding: list[float], text: str) -> CompressedContext:
+        started = time.perf_counter()
+        original_tokens = count_tokens(text, self.model)
+
+        spans = [
+            (start, end, paragraph) for start, end, paragraph in SentenceChunker.sentence_spans(text)
+            if text[start:end].strip()
+        ]
+        if len(spans) <= self.min_sentences:
+            return CompressedContext(
+                text=text,
+                original_tokens=original_tokens,
+                tokens=original_tokens,
+                sentences=len(spans),
+                kept_sentences=len(spans),
+                latency_s=time.perf_counter() - started
+            )
+
+        sentences = [text[start:end].strip() for start, end, _ in spans]
+        vectors = np.asarray(self.embed_fn(sentences), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        scores = vectors @ query
+
+        counts = count_tokens_batch(sentences, self.model)
+        target = int(original_tokens * self.target_ratio) if self.target_ratio else None
+
+        keep, used = set(), 0
+        for i in np.argsort(-scores):
+            i = int(i)
+            if len(keep) >= self.min_sentences:
+                if scores[i] < self.threshold:
+                    break
+                if target is not None and used + counts[i] > target:
+                    continue
+            keep.add(i)
+            used += counts[i]
+
+        # Adjacent sentences read as prose; a gap or a new paragraph starts a new line
+        parts = []
+        previous = None
+        for i in sorted(keep):
+            joiner = " " if previous == i - 1 and not spans[i][2] else "\n"
+            parts.append(sentences[i] if previous is None else joiner + sentences[i])
+            previous = i
+        compressed = "".join(parts)
+        tokens = count_tokens(compressed, self.model)
+
+        # Never send more than the uncompressed context
+        if tokens >= original_tokens:
+            compressed, tokens, keep = text, original_tokens, range(len(spans))
+
+        return CompressedContext(
+            text=compressed,
+            original_tokens=original_tokens,
+            tokens=tokens,
+            sentences=len(spans),
+            kept_sentences=len(keep),
+            latency_s=time.perf_counter() - started
+        )
@@ -0,0 +1,174 @@
+import os
+import re
+from dataclasses import dataclass, field
+from app.services.model_registry import model_registry
+from app.services.token_counter import token_counter
+from app.utils import count_tokens, count_tokens_batch
+
+# Most context tokens a single executor call may carry, per model (config/models.json)
+CONTEXT_BUDGETS = {spec.name: spec.context_budget for spec in model_registry.models()}
+
+SEPARATOR = "\n"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    chunks: list = field(default_factory=list)   # Hits that made it in, in document order
+    tokens: int = 0
+    budget: int = 0
+    dropped: int = 0                             # Duplicates, overlaps and chunks that didn't fit
+
+
+def _normalized(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _doc_order(hit: dict) -> tuple:
+    metadata = hit["metadata"]
+    return (metadata.get("doc_id", ""), metadata.get("position", 0), metadata.get("char_start", 0))
+
+
+class ContextPacker:
+    """
+    Fits retrieved chunks into an explicit token budget.
+
+    1. Exact duplicates and chunks contained in another chunk are removed.
+    2. Chunks are taken greedily by relevance per token
+       (relevance = 1 / (rank + 1) from the retriever's ranking) until the
+       budget is full.
+    3. The survivors go back into document order, and text that overlaps
+       the previous chunk (sliding windows, sentence overlap) is cut off.
+
+    The packed text never exceeds the budget.
+    """
+
+    def __init__(self, budgets: dict = None, default_budget: int = None, model: str = "gpt-4o"):
+        self.budgets = dict(CONTEXT_BUDGETS if budgets is None else budgets)
+        # Before a model is chosen, pack for the smallest window so any choice fits
+        self.default_budget = default_budget or int(
+            os.getenv("TOKEN_DIET_CONTEXT_BUDGET", min(self.budgets.values(), default=4000))
+        )
+        self.model = model
+
+    def budget_for(self, model_name: str = None) -> int:
+        return self.budgets.get(model_name, self.default_budget)
+
+    def pack(self, hits: list[dict], budget: int) -> PackedContext:
+        unique = self._dedupe(hits)
+        dropped = len(hits) - len(unique)
+
+        tokens = count_tokens_batch([hit["text"] for hit in unique], self.model)
+        ranked = sorted(
+            zip(unique, tokens),
+            key=lambda item: (1.0 / (item[0].get("rank", 0) + 1)) / max(item[1], 1),
+            reverse=True
+        )
+
+        # Separator tokens are charged up front, so the sum is an upper bound
+        kept, used = [], 0
+        for hit, hit_tokens in ranked:
+            cost = hit_tokens + (1 if kept else 0)
+            if used + cost > budget:
+                dropped += 1
+                continue
+            kept.append((hit, hit_tokens))
+            used += cost
+
+        # Tokenization across joins can differ slightly; drop the least dense chunk until it fits
+        while kept:
+            text = self.join([hit for hit, _ in kept])
+            packed_tokens = count_tokens(text, self.model)
+            if packed_tokens <= budget:
+                break
+            kept.pop()
+            dropped += 1
+        else:
+            text, packed_tokens = "", 0
+
+        chunks = sorted((hit for hit, _ in kept), key=_doc_order)
+        return PackedContext(
+            text=text,
+            chunks=chunks,
+            tokens=packed_tokens,
+            budget=budget,
+            dropped=dropped
+        )
+
+    def truncate(self, text: str, budget: int) -> PackedContext:
+        """
+        The beginning of `text`, cut to `budget` tokens. Used when nothing
+        could be retrieved and the whole text does not fit.
+        """
+        tokens = token_counter.get_encoding(self.model).encode(text)
+        if len(tokens) <= budget:
+            return PackedContext(text=text, tokens=len(tokens), budget=budget)
+
+        cut = token_counter.get_encoding(self.model).decode(tokens[:budget])
+        # Decoding a cut token stream can re-tokenize a little longer; trim until it fits
+        while cut and count_tokens(cut, self.model) > budget:
+            cut = cut[:int(len(cut) * 0.95)]
+        return PackedContext(text=cut, tokens=count_tokens(cut, self.model), budget=budget)
+
+    @staticmethod
+    def _dedupe(hits: list[dict]) -> list[dict]:
+        """Drops repeated text and chunks whose span lies inside a better-ranked one."""
+        seen_text = set()
+        spans = {}
+        unique = []
+        for hit in sorted(hits, key=lambda hit: hit.get("rank", 0)):
+            normalized = _normalized(hit["text"])
+            if normalized in seen_text:
+                continue
+
+            metadata = hit["metadata"]
+            start, end = metadata.get("char_start"), metadata.get("char_end")
+            doc_spans = spans.setdefault(metadata.get("doc_id"), [])
+            if start is not None and end is not None:
+                if any(s <= start and end <= e for s, e in doc_spans):
+                    continue
+                doc_spans.append((start, end))
+
+            seen_text.add(normalized)
+            unique.append(hit)
+        return unique
+
+    @staticmethod
+    def join(hits: list[dict]) -> str:
+        """
+        Document order, with any text already covered by the previous chunk
+        cut off; pieces that are contiguous in the document are glued back together.
+        """
+        parts = []
+        previous = None
+        for hit in sorted(hits, key=_doc_order):
+            text = hit["text"]
+            metadata = hit["metadata"]
+            contiguous = (
+                previous is not None
+                and previous.get("doc_id") == metadata.get("doc_id")
+                and previous.get("char_end") is not None
+                and metadata.get("char_start") is not None
+                and metadata["char_start"] <= previous["char_end"]
+            )
+            if contiguous:
+                if metadata.get("char_end", 0) <= previous["char_end"]:
+                    continue
+                text = text[previous["char_end"] - metadata["char_start"]:]
+                if parts:
+                    parts[-1] += text
+                else:
+                    parts.append(text)
+            elif text.strip():
+                parts.append(text)
+            previous = metadata
+        return SEPARATOR.join(parts)
+
+
+# Shared instance used by the prune node
+context_packer = ContextPacker()
+
+
+def get_context_packer() -> ContextPacker:
+    """Returns the shared context packer"""
+    return context_packer
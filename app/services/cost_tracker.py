@@ -0,0 +1,72 @@
+from app.services.model_registry import ModelRegistry, model_registry
+from app.utils import count_tokens, count_tokens_batch
+
+# Per-message framing the chat APIs add on top of the content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class CostTracker:
+    """
+    Turns LLM responses into priced call records and rolls them up into
+    the agent state (per call, per node and in total).
+
+    Token counts come from the response's usage metadata when the provider
+    reports it; otherwise they are estimated locally and the record says so.
+    """
+
+    def __init__(self, registry: ModelRegistry = None):
+        self.registry = registry or model_registry
+
+    def record_call(self, node: str, model: str, messages: list, response) -> dict:
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("input_tokens") is not None:
+            input_tokens = usage["input_tokens"]
+            output_tokens = usage.get("output_tokens", 0)
+            estimated = False
+        else:
+            content_tokens = count_tokens_batch([str(message.content) for message in messages])
+            input_tokens = sum(content_tokens) + MESSAGE_OVERHEAD_TOKENS * len(messages)
+            output_tokens = count_tokens(str(getattr(response, "content", "") or ""))
+            estimated = True
+
+        spec = self.registry.get(model)
+        if spec is None:
+            print(f"⚠️ No price for model '{model}' in the model registry, counting it as $0")
+
+        return {
+            "node": node,
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost": spec.cost(input_tokens, output_tokens) if spec else 0.0,
+            "estimated": estimated,
+            "priced": spec is not None
+        }
+
+    def baseline_cost(self, input_tokens: int, output_tokens: int = 300) -> float:
+        """What one call to the most capable model with the whole document would cost."""
+        return self.registry.baseline().cost(input_tokens, output_tokens)
+
+    @staticmethod
+    def accumulate(state: dict, calls: list[dict]) -> dict:
+        """State update adding `calls` to the running totals."""
+        cost_by_node = dict(state.get("cost_by_node") or {})
+        for call in calls:
+            cost_by_node[call["node"]] = round(cost_by_node.get(call["node"], 0.0) + call["cost"], 8)
+
+        total_cost = round((state.get("total_cost") or 0.0) + sum(call["cost"] for call in calls), 8)
+        return {
+            "llm_calls": (state.get("llm_calls") or []) + calls,
+            "cost_by_node": cost_by_node,
+            "total_cost": total_cost,
+            "money_saved": round((state.get("baseline_cost") or 0.0) - total_cost, 6)
+        }
+
+
+# Shared tracker used by the graph nodes
+cost_tracker = CostTracker()
+
+
+def get_cost_tracker() -> CostTracker:
+    """Returns the shared cost tracker"""
+    return cost_tracker
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+
+class DocumentRegistry:
+    """
+    Tracks which documents have been ingested for each tenant.
+    Persisted in SQLite next to the vector DB so a corpus survives restarts
+    and can be searched without re-ingesting.
+
+    Nothing is cached in memory: reads go to the database and each write
+    is one transaction that merges into the stored entry, so API workers
+    and the UI sharing ./db see, and never overwrite, each other's
+    registrations. A `documents.json` from older versions is imported on
+    first open (and renamed to `documents.json.imported`).
+    """
+
+    def __init__(self, path: str = "./db/documents.sqlite"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " tenant TEXT NOT NULL,"
+            " doc_id TEXT NOT NULL,"
+            " info TEXT NOT NULL,"
+            " PRIMARY KEY (tenant, doc_id))"
+        )
+        self._import_json(os.path.splitext(path)[0] + ".json")
+
+    def _import_json(self, json_path: str):
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                documents = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Old document registry unreadable, not imported: {e}")
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO documents VALUES (?, ?, ?)",
+                    [
+                        (tenant_id, doc_id, json.dumps(entry))
+                        for tenant_id, entries in documents.items()
+                        for doc_id, entry in entries.items()
+                    ]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        try:
+            os.replace(json_path, json_path + ".imported")
+        except FileNotFoundError:
+            pass  # Another process imported it at the same time
+
+    def register(self, tenant_id: str, doc_id: str, **info):
+        """Records (or refreshes) a document's metadata."""
+        with self._lock:
+            # IMMEDIATE takes the write lock before reading, so concurrent updates can't interleave
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT info FROM documents WHERE tenant = ? AND doc_id = ?", (tenant_id, doc_id)
+                ).fetchone()
+                entry = json.loads(row[0]) if row else {}
+                entry.update(info)
+                entry["ingested_at"] = datetime.now(timezone.utc).isoformat()
+                self._conn.execute(
+                    "INSERT INTO documents VALUES (?, ?, ?)"
+                    " ON CONFLICT (tenant, doc_id) DO UPDATE SET info = excluded.info",
+                    (tenant_id, doc_id, json.dumps(entry))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def unregister(self, tenant_id: str, doc_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE tenant = ? AND doc_id = ?", (tenant_id, doc_id))
+
+    def get(self, tenant_id: str, doc_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info FROM documents WHERE tenant = ? AND doc_id = ?", (tenant_id, doc_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_documents(self, tenant_id: str) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, info FROM documents WHERE tenant = ? ORDER BY rowid", (tenant_id,)
+            ).fetchall()
+        return {doc_id: json.loads(info) for doc_id, info in rows}
+
+    def tenants(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT tenant FROM documents ORDER BY tenant").fetchall()
+        return [tenant_id for tenant_id, in rows]
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import threading
+from array import array
+
+
+class EmbeddingCache:
+    """
+    Persistent map of chunk content hash -> embedding vector.
+    Lets re-ingestion of an unchanged (or mostly unchanged) document skip
+    the embedding model for every chunk it has already seen.
+    """
+
+    def __init__(self, path: str = "./db/embedding_cache.sqlite", model_name: str = ""):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, hashes: list[str]) -> dict:
+        """Returns {hash: vector} for every hash already in the cache."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings "
+                    f"WHERE model = ? AND hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for chunk_hash, blob in rows:
+                    found[chunk_hash] = array("f", blob).tolist()
+
+        return found
+
+    def put_many(self, items: dict):
+        """Stores {hash: vector} pairs, replacing any previous vectors."""
+        if not items:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                [
+                    (self.model_name, chunk_hash, array("f", vector).tobytes())
+                    for chunk_hash, vector in items.items()
+                ]
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?",
+                (self.model_name,)
+            ).fetchone()[0]
@@ -0,0 +1,158 @@
+import os
+from abc import ABC, abstractmethod
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+class EmbeddingBackend(ABC):
+    """
+    Base embedding backend: texts in, float vectors out.
+
+    Backends load their model lazily in `__init__` (never at import time)
+    and batch `embed_documents` by `batch_size`. `threads` caps intra-op
+    parallelism (None = library default). `signature()` names the backend
+    and every setting that changes the vectors; the embedding cache is
+    keyed by it so vectors from different backends never mix.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = None, threads: int = None):
+        self.model_name = model_name
+        self.batch_size = batch_size or int(os.getenv("TOKEN_DIET_EMBED_BATCH_SIZE", "32"))
+        threads = threads or os.getenv("TOKEN_DIET_EMBED_THREADS")
+        self.threads = int(threads) if threads else None
+
+    def signature(self) -> str:
+        params = ",".join(f"{key}={value}" for key, value in sorted(self._params().items()))
+        return f"{self.name}({params})"
+
+    def _params(self) -> dict:
+        return {"model": self.model_name}
+
+    @abstractmethod
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """One vector per text, in order."""
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class HuggingFaceBackend(EmbeddingBackend):
+    """FP32 PyTorch inference through langchain's HuggingFaceEmbeddings (the original backend)."""
+
+    name = "hf"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = None, threads: int = None):
+        super().__init__(model_name, batch_size, threads)
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+
+        self.model = HuggingFaceEmbeddings(
+            model_name=model_name,
+            encode_kwargs={"batch_size": self.batch_size}
+        )
+
+    def signature(self) -> str:
+        # Same vectors as before backends existed, so existing caches stay valid
+        return self.model_name
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.model.embed_query(text)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Shared sentence-transformers plumbing for the non-default backends."""
+
+    def _load(self, **kwargs):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name, **kwargs)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        vectors = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+        return vectors.tolist()
+
+
+class TorchInt8Backend(SentenceTransformerBackend):
+    """PyTorch with dynamic int8 quantization of every Linear layer (CPU only)."""
+
+    name = "torch-int8"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = None, threads: int = None):
+        super().__init__(model_name, batch_size, threads)
+        import torch
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        self.model = torch.quantization.quantize_dynamic(
+            self._load(device="cpu"), {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+
+class ONNXBackend(SentenceTransformerBackend):
+    """
+    ONNX Runtime inference (sentence-transformers' onnx backend). `file_name`
+    picks the exported graph inside the model repo, e.g. one of its
+    int8-quantized variants.
+    """
+
+    name = "onnx"
+    default_file = "onnx/model.onnx"
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        batch_size: int = None,
+        threads: int = None,
+        file_name: str = None
+    ):
+        super().__init__(model_name, batch_size, threads)
+        import onnxruntime
+
+        self.file_name = file_name or os.getenv("TOKEN_DIET_ONNX_FILE") or self.default_file
+        options = onnxruntime.SessionOptions()
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        self.model = self._load(
+            backend="onnx",
+            model_kwargs={"file_name": self.file_name, "session_options": options}
+        )
+
+    def _params(self) -> dict:
+        return {"model": self.model_name, "file": self.file_name}
+
+
+class ONNXInt8Backend(ONNXBackend):
+    """ONNX Runtime with the model's int8-quantized export (smaller and faster on AVX2 CPUs)."""
+
+    name = "onnx-int8"
+    default_file = "onnx/model_quint8_avx2.onnx"
+
+
+EMBEDDING_BACKENDS = {
+    HuggingFaceBackend.name: HuggingFaceBackend,
+    TorchInt8Backend.name: TorchInt8Backend,
+    ONNXBackend.name: ONNXBackend,
+    ONNXInt8Backend.name: ONNXInt8Backend
+}
+
+
+def get_embedding_backend(backend: str = None, **kwargs) -> EmbeddingBackend:
+    """
+    Builds an embedding backend by name ("hf", "torch-int8", "onnx", "onnx-int8").
+    Defaults to TOKEN_DIET_EMBEDDINGS, or "hf" when unset.
+    """
+    backend = backend or os.getenv("TOKEN_DIET_EMBEDDINGS", HuggingFaceBackend.name)
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend '{backend}'. Choose one of: {', '.join(EMBEDDING_BACKENDS)}"
+        )
+    return EMBEDDING_BACKENDS[backend](**kwargs)
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.file_loader import UploadedBytes, count_pages, file_fingerprint, iter_pages_from_file
+
+
+def upload_doc_id(fingerprint: str) -> str:
+    """Document id of an upload: its content, so equal files share one index entry."""
+    return f"upload-{fingerprint[:32]}"
+
+
+class IngestJob:
+    """One background extraction + indexing run for an uploaded file."""
+
+    def __init__(self, tenant_id: str, doc_id: str, fingerprint: str, total_pages: int, name: str = None):
+        self.tenant_id = tenant_id
+        self.doc_id = doc_id
+        self.name = name or doc_id
+        self.fingerprint = fingerprint
+        self.total_pages = total_pages
+        self.pages_done = 0
+        self.status = "running"     # "running", "done" or "failed"
+        self.error = None
+        self.result = None          # {"document", "characters", "tokens", "stats"}
+        self.started_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def progress(self) -> float:
+        return 1.0 if self.status != "running" else min(self.pages_done / max(self.total_pages, 1), 0.99)
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class IngestJobs:
+    """
+    Extracts and indexes uploads in background threads, keyed by
+    (tenant, doc_id, file fingerprint). Without an explicit doc_id the
+    document id is derived from the file's content (`upload_doc_id`), so
+    every session uploading the same file shares one indexed document.
+
+    Submitting the same file again returns the existing job, so Streamlit
+    reruns and follow-up questions reuse the index and its document handle
+    instead of re-reading the file. A file already indexed by an earlier
+    process (same source fingerprint and chunker in the registry) is not
+    extracted again either. The extracted text is not kept: it
+    lives in the pruner's chunk store. A changed file gets a
+    new job; the pruner's content-addressed sync then only embeds and
+    writes the chunks that differ. Finished jobs are kept in LRU order up
+    to `max_documents`.
+    """
+
+    def __init__(self, pruner_factory, max_workers: int = 2, max_documents: int = 16):
+        # pruner_factory: () -> SemanticPruner (resolved when a job starts)
+        self.pruner_factory = pruner_factory
+        self.max_documents = max_documents
+
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+    def submit(self, tenant_id: str, name: str, data: bytes, file_type: str, doc_id: str = None) -> IngestJob:
+        fingerprint = file_fingerprint(data)
+        doc_id = doc_id or upload_doc_id(fingerprint)
+        key = (tenant_id, doc_id, fingerprint)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != "failed":
+                self._jobs.move_to_end(key)
+                return job
+
+            try:
+                total_pages = count_pages(data, file_type)
+            except Exception:
+                total_pages = 1  # Unreadable file: the job itself reports the error
+            job = IngestJob(tenant_id, doc_id, fingerprint, total_pages, name=name)
+            self._jobs[key] = job
+            self._evict()
+
+        self._executor.submit(self._run, job, UploadedBytes(data, name, file_type))
+        return job
+
+    def _evict(self):
+        finished = [key for key, job in self._jobs.items() if job.done()]
+        while len(self._jobs) > self.max_documents and finished:
+            del self._jobs[finished.pop(0)]
+
+    def _run(self, job: IngestJob, upload: UploadedBytes):
+        def counted_pages():
+            # Index pages as they are extracted
+            for page in iter_pages_from_file(upload):
+                job.pages_done += 1
+                yield page
+
+        try:
+            pruner = self.pruner_factory()
+            entry = pruner.registry.get(job.tenant_id, job.doc_id) or {}
+            if (
+                entry.get("source_fingerprint") == job.fingerprint
+                and entry.get("chunker") == pruner.chunker.signature()
+                and pruner.keyword_index.has_document(job.tenant_id, job.doc_id)
+            ):
+                print(f"♻️ '{job.name}' already indexed, skipping extraction")
+                stats = {
+                    "doc_id": job.doc_id,
+                    "chunks": entry.get("chunks", 0),
+                    "added": 0,
+                    "updated": 0,
+                    "deleted": 0,
+                    "unchanged": entry.get("chunks", 0)
+                }
+                job.pages_done = job.total_pages
+            else:
+                stats = pruner.ingest_stream(
+                    counted_pages(),
+                    doc_id=job.doc_id,
+                    tenant_id=job.tenant_id,
+                    name=job.name
+                )
+                pruner.registry.register(job.tenant_id, job.doc_id, source_fingerprint=job.fingerprint)
+                entry = pruner.registry.get(job.tenant_id, job.doc_id) or {}
+            job.result = {
+                "document": pruner.document_handle(job.tenant_id, [job.doc_id]),
+                "characters": entry.get("characters", 0),
+                "tokens": entry.get("tokens", 0),
+                "stats": stats
+            }
+            job.status = "done"
+        except Exception as e:
+            print(f"⚠️ Ingestion of '{job.name}' failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
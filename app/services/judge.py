@@ -1,47 +1,226 @@
-import os
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+from app.services.cost_tracker import cost_tracker
+from app.services.llm_pool import LLMClientPool, llm_pool
 
 load_dotenv()
 
 
+JUDGE_MODEL = "llama-3.3-70b-versatile"
+
+JUDGE_PROMPT = (
+    "You are a strict QA evaluator.\n"
+    "Score the AI answer from 1 to 10.\n"
+    "Score 8–10 if the answer directly addresses the question.\n"
+    "Score 1–4 if it avoids, deflects, or lacks information.\n"
+    "Reply with ONLY the number."
+)
+
+
+# Phrases that mean the executor could not answer from the context
+REFUSAL_PATTERNS = [
+    "information not available",
+    "not available in the provided context",
+    "not mentioned in the context",
+    "the context does not",
+    "i don't know",
+    "i do not know",
+    "cannot answer"
+]
+
+STOPWORDS = {
+    "the", "and", "for", "that", "this", "with", "from", "are", "was", "were",
+    "have", "has", "had", "its", "it's", "not", "but", "they", "their", "them",
+    "what", "which", "when", "where", "who", "how", "why", "does", "did", "can",
+    "will", "would", "should", "could", "about", "into", "than", "then", "there",
+    "these", "those", "been", "being", "also", "such", "each", "only", "other"
+}
+
+
+@dataclass
+class JudgeVerdict:
+    score: int
+    tier: str       # "heuristic", "cache" or "llm"
+    reason: str = ""
+    call: dict = None   # Priced LLM call record (llm tier only)
+
+
+def _content_words(text: str) -> set:
+    return {
+        word for word in re.findall(r"[a-z0-9][a-z0-9'_-]+", text.lower())
+        if len(word) > 3 and word not in STOPWORDS
+    }
+
+
 class ResponseJudge:
     """
     Evaluates the quality of an AI response.
     Returns a numeric score (1–10) for LangGraph decisions.
+
+    Tiered so the 70B judge only runs when it has to:
+    1. heuristic: clear rejects only (empty answers, refusals and answers
+       with little in common with the retrieved context). Overlapping
+       the context does not mean the question was answered, so nothing
+       is accepted here
+    2. cache: LLM verdicts are memoized by (query, response) hash
+    3. llm: everything else goes to the judge model
     """
 
-    def __init__(self):
-        self.llm = ChatGroq(
-            api_key=os.getenv("GROQ_API_KEY"),
-            model_name="llama-3.3-70b-versatile"
-        )
+    def __init__(
+        self,
+        ungrounded_threshold: float = 0.3,
+        embed_fn=None,
+        similarity_floor: float = 0.5,
+        max_cached_verdicts: int = 2048,
+        pool: LLMClientPool = None
+    ):
+        self.pool = pool or llm_pool
+        self.model_name = JUDGE_MODEL
+
+        self.ungrounded_threshold = ungrounded_threshold
+        self.embed_fn = embed_fn
+        self.similarity_floor = similarity_floor
+        self.max_cached_verdicts = max_cached_verdicts
+
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def evaluate(self, query: str, response: str, context: str = None, context_vectors: list = None) -> JudgeVerdict:
+        """
+        `context_vectors` are the embeddings of the chunks in `context`
+        (the pruner already has them); without them the ungrounded check
+        is lexical only.
+        """
+        verdict = self._heuristic(query, response, context, context_vectors)
+        if verdict is None:
+            verdict = self._cached(query, response)
+        if verdict is None:
+            messages = self._messages(query, response)
+            verdict = self._llm_verdict(messages, self.pool.invoke(self.model_name, messages))
+            self._remember(query, response, verdict.score)
+
+        print(f"🧪 JUDGE SCORE: {verdict.score}/10 ({verdict.tier}{': ' + verdict.reason if verdict.reason else ''})")
+        return verdict
+
+    def evaluate_response(self, query: str, response: str, context: str = None) -> int:
+        return self.evaluate(query, response, context).score
 
-    def evaluate_response(self, query: str, response: str) -> int:
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                "You are a strict QA evaluator.\n"
-                "Score the AI answer from 1 to 10.\n"
-                "Score 8–10 if the answer directly addresses the question.\n"
-                "Score 1–4 if it avoids, deflects, or lacks information.\n"
-                "Reply with ONLY the number."
-            ),
-            (
-                "human",
-                f"User Question:\n{query}\n\nAI Response:\n{response}"
-            )
-        ])
-
-        chain = prompt | self.llm
-        result = chain.invoke({}).content.strip()
+    async def aevaluate(
+        self,
+        query: str,
+        response: str,
+        context: str = None,
+        context_vectors: list = None
+    ) -> JudgeVerdict:
+        # The embedding check is CPU-bound, keep it off the event loop
+        verdict = await asyncio.to_thread(self._heuristic, query, response, context, context_vectors)
+        if verdict is None:
+            verdict = self._cached(query, response)
+        if verdict is None:
+            messages = self._messages(query, response)
+            verdict = self._llm_verdict(messages, await self.pool.ainvoke(self.model_name, messages))
+            self._remember(query, response, verdict.score)
 
+        print(f"🧪 JUDGE SCORE: {verdict.score}/10 ({verdict.tier}{': ' + verdict.reason if verdict.reason else ''})")
+        return verdict
+
+    # -------------------------
+    # Tier 1: local heuristics
+    # -------------------------
+
+    def _heuristic(self, query: str, response: str, context: str = None, context_vectors: list = None):
+        answer = (response or "").strip()
+        if not answer:
+            return JudgeVerdict(1, "heuristic", "empty answer")
+
+        lowered = answer.lower()
+        if len(answer) < 200 and any(pattern in lowered for pattern in REFUSAL_PATTERNS):
+            return JudgeVerdict(2, "heuristic", "refusal")
+
+        if not context:
+            return None
+
+        # Ungrounded: most of what the answer says is nowhere in the context,
+        # lexically and (when chunk vectors are available) semantically
+        answer_words = _content_words(answer)
+        if len(answer_words) < 5:
+            return None
+        grounding = len(answer_words & _content_words(context)) / len(answer_words)
+        if grounding >= self.ungrounded_threshold:
+            return None
+
+        if self.embed_fn is not None and context_vectors:
+            similarity = self._max_similarity(self.embed_fn(answer), context_vectors)
+            if similarity >= self.similarity_floor:
+                return None
+            return JudgeVerdict(3, "heuristic", f"ungrounded ({grounding:.0%} lexical overlap, {similarity:.2f} similarity)")
+
+        return JudgeVerdict(3, "heuristic", f"ungrounded ({grounding:.0%} lexical overlap)")
+
+    @staticmethod
+    def _max_similarity(vector: list, context_vectors: list) -> float:
+        """Cosine similarity of the answer to its closest context chunk."""
+        norm = sum(x * x for x in vector) ** 0.5
+        best = 0.0
+        for chunk_vector in context_vectors:
+            dot = sum(x * y for x, y in zip(vector, chunk_vector))
+            chunk_norm = sum(y * y for y in chunk_vector) ** 0.5
+            if norm and chunk_norm:
+                best = max(best, dot / (norm * chunk_norm))
+        return best
+
+    # -------------------------
+    # Tier 2: verdict cache
+    # -------------------------
+
+    @staticmethod
+    def _key(query: str, response: str) -> str:
+        return hashlib.sha256(f"{query}\x00{response}".encode("utf-8")).hexdigest()
+
+    def _cached(self, query: str, response: str):
+        key = self._key(query, response)
+        with self._lock:
+            score = self._verdicts.get(key)
+            if score is None:
+                return None
+            self._verdicts.move_to_end(key)
+        return JudgeVerdict(score, "cache")
+
+    def _remember(self, query: str, response: str, score: int):
+        with self._lock:
+            self._verdicts[self._key(query, response)] = score
+            while len(self._verdicts) > self.max_cached_verdicts:
+                self._verdicts.popitem(last=False)
+
+    # -------------------------
+    # Tier 3: LLM judge
+    # -------------------------
+
+    @staticmethod
+    def _messages(query: str, response: str) -> list:
+        # Imported on first LLM verdict, keeping langchain_core out of import time
+        from langchain_core.messages import HumanMessage, SystemMessage
+        return [
+            SystemMessage(content=JUDGE_PROMPT),
+            HumanMessage(content=f"User Question:\n{query}\n\nAI Response:\n{response}")
+        ]
+
+    @staticmethod
+    def _parse_score(result: str) -> int:
         # Defensive parsing (LLMs sometimes misbehave)
         try:
-            score = int(result)
+            return int(result.strip())
         except ValueError:
-            score = 3  # default fail-safe
+            return 3  # default fail-safe
 
-        print(f"🧪 JUDGE SCORE: {score}/10")
-        return score
+    def _llm_verdict(self, messages: list, result) -> JudgeVerdict:
+        return JudgeVerdict(
+            self._parse_score(result.content),
+            "llm",
+            call=cost_tracker.record_call("judge", self.model_name, messages, result)
+        )
@@ -0,0 +1,202 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+# Identifiers such as "7.2.1", "ERR-404", "SKU_1234" or "a/b" stay one term,
+# and their parts are indexed as well
+TERM_PATTERN = re.compile(r"[a-z0-9]+(?:[._:/-][a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "how", "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to",
+    "was", "were", "what", "when", "where", "which", "who", "why", "will", "with"
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased terms of a text, with compound identifiers kept whole and split."""
+    terms = []
+    for term in TERM_PATTERN.findall(text.lower()):
+        if term in STOPWORDS:
+            continue
+        terms.append(term)
+        parts = re.split(r"[._:/-]", term)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """
+    Merges several ranked id lists into one: each list contributes
+    1 / (k + rank) per id, so items ranked well by any list rise to the top.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class KeywordIndex:
+    """
+    Persistent BM25 inverted index over chunk text, kept next to the vector DB.
+
+    Catches what MiniLM similarity misses: exact identifiers like clause
+    numbers, SKUs and error codes. Chunks are added and removed by record id
+    as documents are (re-)ingested, so the index is updated incrementally.
+    """
+
+    def __init__(self, path: str = "./db/keyword_index.sqlite", k1: float = 1.5, b: float = 0.75):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._corpus_stats = {}
+        self._stats_version = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " tenant TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " doc_id TEXT NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " PRIMARY KEY (tenant, id));"
+            "CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (tenant, doc_id);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " tenant TEXT NOT NULL,"
+            " term TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " tf INTEGER NOT NULL,"
+            " PRIMARY KEY (tenant, term, id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS postings_id ON postings (tenant, id);"
+        )
+        self._conn.commit()
+
+    def add(self, tenant_id: str, chunks: list[tuple]):
+        """Indexes (record_id, doc_id, text) triples; ids already indexed are skipped."""
+        if not chunks:
+            return
+
+        with self._lock:
+            known = self._existing_ids(tenant_id, [record_id for record_id, _, _ in chunks])
+            rows, postings = [], []
+            for record_id, doc_id, text in chunks:
+                if record_id in known:
+                    continue
+                known.add(record_id)
+                terms = Counter(tokenize(text))
+                rows.append((tenant_id, record_id, doc_id, sum(terms.values())))
+                postings.extend((tenant_id, term, record_id, tf) for term, tf in terms.items())
+
+            if rows:
+                self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+                self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", postings)
+                self._conn.commit()
+                self._corpus_stats.pop(tenant_id, None)
+
+    def remove(self, tenant_id: str, record_ids: list[str]):
+        """Drops chunks by record id."""
+        if not record_ids:
+            return
+
+        with self._lock:
+            for start in range(0, len(record_ids), 500):
+                batch = record_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(
+                    f"DELETE FROM postings WHERE tenant = ? AND id IN ({placeholders})", [tenant_id, *batch]
+                )
+                self._conn.execute(
+                    f"DELETE FROM chunks WHERE tenant = ? AND id IN ({placeholders})", [tenant_id, *batch]
+                )
+            self._conn.commit()
+            self._corpus_stats.pop(tenant_id, None)
+
+    def remove_document(self, tenant_id: str, doc_id: str):
+        """Drops every chunk of one document."""
+        with self._lock:
+            record_ids = [
+                row[0] for row in self._conn.execute(
+                    "SELECT id FROM chunks WHERE tenant = ? AND doc_id = ?", (tenant_id, doc_id)
+                )
+            ]
+        self.remove(tenant_id, record_ids)
+
+    def has_document(self, tenant_id: str, doc_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM chunks WHERE tenant = ? AND doc_id = ? LIMIT 1", (tenant_id, doc_id)
+            ).fetchone() is not None
+
+    def search(self, query: str, k: int = 6, tenant_id: str = "default", doc_ids=None) -> list[tuple]:
+        """
+        Returns up to `k` (record_id, score) pairs ranked by BM25.
+        IDF is computed over the tenant's whole corpus; `doc_ids` only
+        restricts which chunks can be returned.
+        """
+        terms = Counter(tokenize(query))
+        if not terms:
+            return []
+        if isinstance(doc_ids, str):
+            doc_ids = [doc_ids]
+        allowed = set(doc_ids) if doc_ids else None
+
+        with self._lock:
+            total, avg_length = self._stats(tenant_id)
+            if not total:
+                return []
+
+            placeholders = ",".join("?" * len(terms))
+            rows = self._conn.execute(
+                f"SELECT p.term, p.id, p.tf, c.length, c.doc_id FROM postings p "
+                f"JOIN chunks c ON c.tenant = p.tenant AND c.id = p.id "
+                f"WHERE p.tenant = ? AND p.term IN ({placeholders})",
+                [tenant_id, *terms]
+            ).fetchall()
+
+        document_frequency = Counter(term for term, *_ in rows)
+        scores = {}
+        for term, record_id, tf, length, doc_id in rows:
+            if allowed is not None and doc_id not in allowed:
+                continue
+            df = document_frequency[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+            scores[record_id] = scores.get(record_id, 0.0) + terms[term] * idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def _existing_ids(self, tenant_id: str, record_ids: list[str]) -> set:
+        found = set()
+        for start in range(0, len(record_ids), 500):
+            batch = record_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                row[0] for row in self._conn.execute(
+                    f"SELECT id FROM chunks WHERE tenant = ? AND id IN ({placeholders})", [tenant_id, *batch]
+                )
+            )
+        return found
+
+    def _stats(self, tenant_id: str) -> tuple:
+        # (chunk count, average chunk length), cached until the tenant's index changes.
+        # data_version moves when another connection (worker process) commits, and
+        # this process's own writes drop their tenant's entry directly
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._stats_version:
+            self._corpus_stats.clear()
+            self._stats_version = version
+
+        stats = self._corpus_stats.get(tenant_id)
+        if stats is None:
+            total, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM chunks WHERE tenant = ?", (tenant_id,)
+            ).fetchone()
+            stats = (total, avg_length or 1.0)
+            self._corpus_stats[tenant_id] = stats
+        return stats
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return (
+        status == 429
+        or type(error).__name__ == "RateLimitError"
+        or "rate limit" in str(error).lower()
+    )
+
+
+def _retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClientPool:
+    """
+    One long-lived, keep-alive ChatGroq client per model, shared by every
+    request in the process, with a cap on concurrent calls and
+    rate-limit-aware exponential backoff.
+
+    Sync callers are limited by a thread semaphore, async callers by an
+    asyncio semaphore (one per event loop); both share `max_concurrency`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0
+    ):
+        self.max_concurrency = max_concurrency or int(os.getenv("TOKEN_DIET_LLM_CONCURRENCY", "32"))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._sync_limit = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_limits = weakref.WeakKeyDictionary()
+
+    def get(self, model_name: str):
+        """Returns the shared client for a model, creating it on first use."""
+        client = self._clients.get(model_name)
+        if client is None:
+            # Imported on first use: the Groq SDK is slow to import
+            from langchain_groq import ChatGroq
+
+            with self._lock:
+                client = self._clients.get(model_name)
+                if client is None:
+                    client = ChatGroq(
+                        api_key=os.getenv("GROQ_API_KEY"),
+                        model_name=model_name
+                    )
+                    self._clients[model_name] = client
+        return client
+
+    def register(self, model_name: str, client):
+        """Installs a client for a model instead of a ChatGroq one (e.g. an offline stand-in)."""
+        with self._lock:
+            self._clients[model_name] = client
+
+    def _async_limit(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            limit = self._async_limits.get(loop)
+            if limit is None:
+                limit = asyncio.Semaphore(self.max_concurrency)
+                self._async_limits[loop] = limit
+        return limit
+
+    def _delay(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def invoke(self, model_name: str, messages: list):
+        client = self.get(model_name)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._sync_limit:
+                    return client.invoke(messages)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_rate_limited(e):
+                    raise
+                delay = self._delay(attempt, e)
+                print(f"⏳ Rate limited on {model_name}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stream(self, model_name: str, messages: list):
+        client = self.get(model_name)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                with self._sync_limit:
+                    for chunk in client.stream(messages):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                # Never retry once tokens have been handed out
+                if started or attempt == self.max_retries or not _is_rate_limited(e):
+                    raise
+                delay = self._delay(attempt, e)
+                print(f"⏳ Rate limited on {model_name}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def ainvoke(self, model_name: str, messages: list):
+        client = self.get(model_name)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._async_limit():
+                    return await client.ainvoke(messages)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_rate_limited(e):
+                    raise
+                delay = self._delay(attempt, e)
+                print(f"⏳ Rate limited on {model_name}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def astream(self, model_name: str, messages: list):
+        client = self.get(model_name)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async with self._async_limit():
+                    async for chunk in client.astream(messages):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or attempt == self.max_retries or not _is_rate_limited(e):
+                    raise
+                delay = self._delay(attempt, e)
+                print(f"⏳ Rate limited on {model_name}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+# Process-wide pool shared by the executor and the judge
+llm_pool = LLMClientPool()
+
+
+def get_llm_pool() -> LLMClientPool:
+    """Returns the shared LLM client pool"""
+    return llm_pool
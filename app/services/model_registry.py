@@ -0,0 +1,75 @@
+import json
+import os
+from dataclasses import dataclass, fields
+
+DEFAULT_REGISTRY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "config",
+    "models.json"
+)
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Price, limits and speed of one model the agent can call."""
+    name: str
+    provider: str = "groq"
+    tier: int = 1                       # Higher = more capable (and usually pricier)
+    input_per_1m: float = 0.0           # USD per 1M input tokens
+    output_per_1m: float = 0.0          # USD per 1M output tokens
+    context_tokens: int = 8192          # Hard context window
+    context_budget: int = 4000          # Retrieved-context tokens we allow per call
+    ttft_ms: float = 300.0              # Time to first token
+    prefill_tokens_per_s: float = 10000.0
+    output_tokens_per_s: float = 200.0
+
+    def cost(self, input_tokens: int, output_tokens: int = 0) -> float:
+        return (input_tokens * self.input_per_1m + output_tokens * self.output_per_1m) / 1_000_000
+
+    def latency_ms(self, input_tokens: int, output_tokens: int = 0) -> float:
+        return (
+            self.ttft_ms
+            + input_tokens / self.prefill_tokens_per_s * 1000
+            + output_tokens / self.output_tokens_per_s * 1000
+        )
+
+
+class ModelRegistry:
+    """
+    The models the agent may route to, loaded from a JSON config file
+    (`config/models.json`, or TOKEN_DIET_MODEL_REGISTRY).
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("TOKEN_DIET_MODEL_REGISTRY", DEFAULT_REGISTRY_PATH)
+        with open(self.path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+        known = {field.name for field in fields(ModelSpec)}
+        self._models = {}
+        for entry in config.get("models", []):
+            spec = ModelSpec(**{key: value for key, value in entry.items() if key in known})
+            self._models[spec.name] = spec
+
+    def get(self, name: str) -> ModelSpec:
+        return self._models.get(name)
+
+    def models(self) -> list[ModelSpec]:
+        """All models, cheapest tier first."""
+        return sorted(self._models.values(), key=lambda spec: (spec.tier, spec.input_per_1m))
+
+    def baseline(self) -> ModelSpec:
+        """The most capable (then priciest) model: what an unoptimized pipeline would call."""
+        return max(self._models.values(), key=lambda spec: (spec.tier, spec.input_per_1m))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+
+# Shared registry used by the router, context packer and cost accounting
+model_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Returns the shared model registry"""
+    return model_registry
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the question."""
+    return re.sub(r"\s+", " ", prompt).strip().lower().rstrip("?!. ")
+
+
+class ResponseCache:
+    """
+    Persistent cache of accepted answers, keyed by
+    (document fingerprint, normalized prompt, model).
+
+    Two tiers:
+    - exact: same document, same normalized prompt, same model
+    - semantic: same document and model, and a query embedding whose cosine
+      similarity to a cached question is above `similarity_threshold`
+
+    Entries expire after `ttl_seconds`; beyond `max_entries` the least
+    recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str = "./db/response_cache.sqlite",
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        similarity_threshold: float = 0.92
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " fingerprint TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " prompt TEXT NOT NULL,"
+            " embedding BLOB,"
+            " response TEXT NOT NULL,"
+            " quality_score INTEGER,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_scope ON responses (fingerprint, model)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(fingerprint: str, prompt: str, model: str) -> str:
+        raw = f"{fingerprint}\x00{normalize_prompt(prompt)}\x00{model}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, fingerprint: str, prompt: str, model: str, query_embedding=None):
+        """
+        Returns (entry, tier) on a hit, where tier is "exact" or "semantic",
+        or None on a miss.
+        """
+        now = time.time()
+        oldest = now - self.ttl_seconds
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, response, quality_score FROM responses "
+                "WHERE key = ? AND created_at >= ?",
+                (self._key(fingerprint, prompt, model), oldest)
+            ).fetchone()
+            tier = "exact" if row else None
+
+            if row is None and query_embedding is not None:
+                row = self._semantic_match(fingerprint, model, query_embedding, oldest)
+                tier = "semantic" if row else None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, row[0]))
+            self._conn.commit()
+
+            if tier == "exact":
+                self.hits_exact += 1
+            else:
+                self.hits_semantic += 1
+
+        return {"response": row[1], "quality_score": row[2]}, tier
+
+    def _semantic_match(self, fingerprint: str, model: str, query_embedding, oldest: float):
+        rows = self._conn.execute(
+            "SELECT key, response, quality_score, embedding FROM responses "
+            "WHERE fingerprint = ? AND model = ? AND created_at >= ? AND embedding IS NOT NULL",
+            (fingerprint, model, oldest)
+        ).fetchall()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        # Rows embedded by a model of another size (TOKEN_DIET_EMBEDDINGS changed) can't be compared
+        rows = [row for row in rows if len(row[3]) == query.nbytes]
+        if not rows:
+            return None
+
+        matrix = np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+        similarity = (matrix @ query) / (
+            np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12
+        )
+
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.similarity_threshold:
+            return None
+        return rows[best][:3]
+
+    def put(
+        self,
+        fingerprint: str,
+        prompt: str,
+        model: str,
+        response: str,
+        quality_score: int = None,
+        query_embedding=None
+    ):
+        now = time.time()
+        embedding = (
+            np.asarray(query_embedding, dtype=np.float32).tobytes()
+            if query_embedding is not None else None
+        )
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, fingerprint, model, prompt, embedding, response, quality_score, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self._key(fingerprint, prompt, model),
+                    fingerprint,
+                    model,
+                    normalize_prompt(prompt),
+                    embedding,
+                    response,
+                    quality_score,
+                    now,
+                    now
+                )
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?",
+            (now - self.ttl_seconds,)
+        )
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "entries": entries
+            }
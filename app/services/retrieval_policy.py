@@ -0,0 +1,39 @@
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class RetrievalStep:
+    """How wide to search on one iteration of the self-correction loop."""
+    k: int
+    neighbors: int = 0
+    mmr: bool = False
+
+
+@dataclass
+class RetrievalPolicy:
+    """
+    Escalates retrieval on each retry instead of repeating the same search.
+
+    Iteration 0 takes the top `k`; later iterations widen k, pull in the
+    chunks around each hit and diversify with MMR. Every retry only sends
+    chunks that were not sent before, and the loop stops once the context
+    token budget is spent or the corpus has nothing new to offer.
+    """
+
+    schedule: list = field(default_factory=lambda: [
+        RetrievalStep(k=6),
+        RetrievalStep(k=12, neighbors=1),
+        RetrievalStep(k=24, neighbors=1, mmr=True)
+    ])
+    token_budget: int = 8000
+
+    def step(self, iteration: int) -> RetrievalStep:
+        return self.schedule[min(iteration, len(self.schedule) - 1)]
+
+    def has_more(self, state: dict) -> bool:
+        """True while another retrieval round can still add new context."""
+        if state.get("retrieval_exhausted"):
+            return False
+        if state.get("tokens_sent", 0) >= self.token_budget:
+            return False
+        return state.get("iteration_count", 0) < len(self.schedule)
@@ -1,28 +1,267 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+import numpy as np
+from app.services.model_registry import ModelRegistry, model_registry
 from app.utils import count_tokens
 
+# Fallback complexity signal until enough judge outcomes are logged.
+# Whole words only: "why" must not match "anywhere".
+COMPLEX_PATTERN = re.compile(
+    r"\b(?:analy[sz]\w*|debug\w*|optimi[sz]\w*|calculat\w*|rewrit\w*|evaluat\w*|why|architect\w*)\b",
+    re.IGNORECASE
+)
+
+# System prompt and message framing around the context
+PROMPT_OVERHEAD_TOKENS = 60
+
+
+@dataclass
+class RoutingDecision:
+    model: str
+    complexity: float               # Estimated probability the query needs a stronger tier
+    required_tier: int
+    estimated_cost: float           # USD for this call
+    estimated_latency_ms: float
+    reason: str
+
+
+class RoutingOutcomes:
+    """
+    Persistent log of judge outcomes per (query embedding, model), the
+    training data for the router's complexity classifier.
+    """
+
+    def __init__(self, path: str = "./db/routing_outcomes.sqlite"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outcomes ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " embedding BLOB NOT NULL,"
+            " model TEXT NOT NULL,"
+            " tier INTEGER NOT NULL,"
+            " score INTEGER NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def record(self, embedding: list[float], model: str, tier: int, score: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outcomes (embedding, model, tier, score, created_at) VALUES (?, ?, ?, ?, ?)",
+                (array("f", embedding).tobytes(), model, tier, score, time.time())
+            )
+            self._conn.commit()
+
+    def training_set(self, tier: int, passing_score: int = 7) -> tuple:
+        """
+        (X, y) from outcomes on `tier`: y = 1 when that tier's answer was
+        rejected (the query needed more), 0 when it was accepted.
+        Rows come back in insertion order, so training is deterministic.
+        Only rows with the latest embedding size are used, in case the
+        embedding model changed.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT embedding, score FROM outcomes WHERE tier = ? ORDER BY id", (tier,)
+            ).fetchall()
+
+        rows = [row for row in rows if len(row[0]) == len(rows[-1][0])]
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int8)
+        X = np.stack([np.frombuffer(blob, dtype=np.float32) for blob, _ in rows])
+        y = np.array([score < passing_score for _, score in rows], dtype=np.int8)
+        return X, y
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outcomes").fetchone()[0]
+
+
 class ModelRouter:
-    def __init__(self):
-        # Keywords that signal high reasoning is needed
-        self.complex_keywords = [
-            "analyze", "debug", "optimize", "calculate", 
-            "rewrite", "evaluate", "why", "architect"
+    """
+    Picks the cheapest model that can answer.
+
+    1. Complexity: a nearest-centroid classifier over the query embedding,
+       trained from logged judge outcomes on the cheapest tier ("accepted"
+       vs "rejected" centroids). Until both classes have `min_samples`
+       examples, whole-word keywords and prompt length stand in.
+    2. Required tier: complexity above `complexity_threshold` asks for the
+       next tier up; every retry escalates one more tier.
+    3. Among registry models at or above that tier whose context window
+       fits prompt + context + expected output, the cheapest one that meets
+       the latency SLO wins (the fastest one if none does).
+
+    A decision is two dot products and a few arithmetic operations, and
+    it is fully determined by the inputs and the logged outcomes.
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry = None,
+        outcomes: RoutingOutcomes = None,
+        complexity_threshold: float = 0.5,
+        latency_slo_ms: float = None,
+        expected_output_tokens: int = 300,
+        min_samples: int = 20,
+        retrain_every: int = 50,
+        temperature: float = 20.0
+    ):
+        self.registry = registry or model_registry
+        self.outcomes = outcomes or RoutingOutcomes()
+        self.complexity_threshold = complexity_threshold
+        slo = os.getenv("TOKEN_DIET_LATENCY_SLO_MS")
+        self.latency_slo_ms = latency_slo_ms if latency_slo_ms is not None else (float(slo) if slo else None)
+        self.expected_output_tokens = expected_output_tokens
+        self.min_samples = min_samples
+        self.retrain_every = retrain_every
+        self.temperature = temperature
+
+        self.tiers = sorted({spec.tier for spec in self.registry.models()})
+        self._centroids = None
+        self._sums = {}             # label -> (sum of unit embeddings, count), cheapest tier only
+        self._since_training = 0
+        self._lock = threading.Lock()
+        self.train()
+
+    # -------------------------
+    # Complexity classifier
+    # -------------------------
+
+    def train(self) -> bool:
+        """Refits the centroids from the whole outcome log; returns True if the classifier is active."""
+        X, y = self.outcomes.training_set(self.tiers[0])
+        sums = {}
+        if len(X):
+            X = X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+            sums = {label: (X[y == label].sum(axis=0), int((y == label).sum())) for label in (0, 1)}
+
+        with self._lock:
+            self._sums = sums
+            self._centroids = self._fit(sums)
+        return self._centroids is not None
+
+    def _fit(self, sums: dict):
+        if len(sums) < 2 or min(count for _, count in sums.values()) < self.min_samples:
+            return None
+        # A class's summed unit vectors point the same way as its mean
+        centroids = np.stack([sums[0][0], sums[1][0]])
+        return centroids / (np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12)
+
+    def _learn(self, query_embedding: list[float], score: int, passing_score: int = 7):
+        """Folds one cheapest-tier outcome into the class sums, in O(embedding size)."""
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) + 1e-12)
+        label = int(score < passing_score)
+
+        with self._lock:
+            sums = dict(self._sums)
+            if any(total.shape != vector.shape for total, _ in sums.values()):
+                # The embedding model changed: start over, like training_set does
+                sums = {}
+            total, count = sums.get(label, (np.zeros_like(vector), 0))
+            sums[label] = (total + vector, count + 1)
+            self._sums = sums
+            self._centroids = self._fit(sums)
+
+    def complexity(self, prompt: str, query_embedding: list[float] = None) -> tuple:
+        """Returns (probability the query needs a stronger tier, source of the estimate)."""
+        centroids = self._centroids
+        if centroids is not None and query_embedding is not None and len(query_embedding) == centroids.shape[1]:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query = query / (np.linalg.norm(query) + 1e-12)
+            simple, complex_ = centroids @ query
+            return 1.0 / (1.0 + math.exp(-self.temperature * float(complex_ - simple))), "classifier"
+
+        if count_tokens(prompt) > 200 or COMPLEX_PATTERN.search(prompt):
+            return 1.0, "keywords"
+        return 0.0, "keywords"
+
+    def record_outcome(self, query_embedding: list[float], model: str, score: int):
+        """
+        Logs a judge verdict for a routed query and updates the centroids
+        incrementally. Every `retrain_every` outcomes the whole log (which
+        other workers write to as well) is refit on a background thread,
+        never on the caller's.
+        """
+        spec = self.registry.get(model)
+        if spec is None or query_embedding is None:
+            return
+        self.outcomes.record(query_embedding, model, spec.tier, score)
+        if spec.tier == self.tiers[0]:
+            self._learn(query_embedding, score)
+
+        with self._lock:
+            self._since_training += 1
+            due = self._since_training >= self.retrain_every
+            if due:
+                self._since_training = 0
+        if due:
+            threading.Thread(target=self.train, name="router-train", daemon=True).start()
+
+    # -------------------------
+    # Policy
+    # -------------------------
+
+    def route(
+        self,
+        prompt: str,
+        context_tokens: int = 0,
+        query_embedding: list[float] = None,
+        iteration: int = 0
+    ) -> RoutingDecision:
+        complexity, source = self.complexity(prompt, query_embedding)
+
+        level = 1 if complexity >= self.complexity_threshold else 0
+        required_tier = self.tiers[min(level + iteration, len(self.tiers) - 1)]
+
+        input_tokens = count_tokens(prompt) + context_tokens + PROMPT_OVERHEAD_TOKENS
+        output_tokens = self.expected_output_tokens
+
+        models = self.registry.models()
+        candidates = [
+            spec for spec in models
+            if spec.tier >= required_tier and spec.context_tokens >= input_tokens + output_tokens
         ]
+        if not candidates:
+            # Nothing capable enough fits: take the largest window available
+            candidates = [max(models, key=lambda spec: spec.context_tokens)]
+
+        within_slo = [
+            spec for spec in candidates
+            if self.latency_slo_ms is None or spec.latency_ms(input_tokens, output_tokens) <= self.latency_slo_ms
+        ]
+        if within_slo:
+            chosen = min(within_slo, key=lambda spec: (spec.cost(input_tokens, output_tokens), spec.tier))
+            why = "cheapest fit"
+        else:
+            chosen = min(candidates, key=lambda spec: spec.latency_ms(input_tokens, output_tokens))
+            why = "fastest, SLO missed"
+
+        return RoutingDecision(
+            model=chosen.name,
+            complexity=complexity,
+            required_tier=required_tier,
+            estimated_cost=chosen.cost(input_tokens, output_tokens),
+            estimated_latency_ms=chosen.latency_ms(input_tokens, output_tokens),
+            reason=f"{source} complexity {complexity:.2f} → tier {required_tier}, {why} ({input_tokens} input tokens)"
+        )
+
+    def select_model(self, prompt: str, **kwargs) -> str:
+        return self.route(prompt, **kwargs).model
 
-    def select_model(self, prompt: str) -> str:
-        # 1. Check length (Volume check)
-        token_count = count_tokens(prompt)
-        
-        # 2. Check intent (Keyword check)
-        is_complex = any(kw in prompt.lower() for kw in self.complex_keywords)
-        
-        # 3. Final decision
-        if token_count > 200 or is_complex:
-            return "llama-3.1-405b-reasoning"  # The "Premium" model
-        
-        return "llama-3.3-70b-versatile" # The "Economy" model
 
 # Test logic for verification
 if __name__ == "__main__":
     router = ModelRouter()
-    print(f"Test 1: {router.select_model('Hi, how are you?')}") # Should be mini
-    print(f"Test 2: {router.select_model('Debug this memory leak in my Python app')}") # Should be 4o
\ No newline at end of file
+    print(f"Test 1: {router.select_model('Hi, how are you?')}") # Should be the economy model
+    print(f"Test 2: {router.select_model('Debug this memory leak in my Python app')}") # Should be the premium model
+    print(f"Test 3: {router.select_model('Is it stored anywhere?')}") # "anywhere" is not "why"
@@ -0,0 +1,271 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# The node span being recorded in this context (copied into worker threads by asyncio.to_thread)
+_current_span = contextvars.ContextVar("token_diet_span", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@contextmanager
+def timed(kind: str):
+    """Adds the block's duration to `<kind>_ms` on the current node span (no-op outside a node)."""
+    span = _current_span.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if span is not None:
+            attributes = span["attributes"]
+            key = f"{kind}_ms"
+            attributes[key] = attributes.get(key, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def state_size(value) -> int:
+    """
+    Estimated JSON size in bytes of a graph state or update, roughly what a
+    checkpointer writes per step. Strings count by length and containers by
+    their items plus punctuation, so nothing is serialized: a 100k-character
+    context costs one len() rather than a full json.dumps on every node.
+    """
+    if isinstance(value, str):
+        return len(value) + 2
+    if isinstance(value, dict):
+        return 2 + sum(len(str(key)) + 4 + state_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 2 + sum(state_size(item) + 1 for item in value)
+    if value is None or isinstance(value, bool):
+        return 5
+    if isinstance(value, (int, float)):
+        return len(repr(value))
+    return len(str(value)) + 2
+
+
+def annotate(**attributes):
+    """Sets attributes on the current node span (no-op outside a node)."""
+    span = _current_span.get()
+    if span is not None:
+        span["attributes"].update(attributes)
+
+
+class Telemetry:
+    """
+    Structured per-node instrumentation for the agent graph.
+
+    `instrument(name)` wraps a node (sync or async) in an OpenTelemetry-style
+    span with wall time, iteration, tokens in/out, cache hits and whatever
+    the node and the `timed()` blocks below it add (embedding, Chroma and
+    keyword-index time), plus the size of the state the node received
+    (`state_bytes`) and of the update it returned (`update_bytes`).
+    Each finished span is:
+    - appended to the run's `trace` in the agent state (the UI reads it),
+    - written as one JSON line to `trace_path` (empty string disables) by a
+      background thread, so nodes never wait on the file,
+    - folded into Prometheus-style histograms and counters (`prometheus()`).
+    """
+
+    def __init__(self, trace_path: str = None):
+        self.trace_path = trace_path if trace_path is not None else os.getenv(
+            "TOKEN_DIET_TRACE_FILE", "./db/traces.jsonl"
+        )
+        if self.trace_path:
+            os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._durations = {}    # node -> [bucket counts..., +Inf count, sum]
+        self._counters = {}     # (metric, node) -> value
+
+        # Spans waiting to be appended to the trace file
+        self._pending = queue.Queue()
+        self._writer = None
+        if hasattr(os, "register_at_fork"):
+            # A forked worker inherits the queue but not the thread draining it
+            os.register_at_fork(after_in_child=self._reset_writer)
+
+    def instrument(self, name: str):
+        def decorator(node):
+            if inspect.iscoroutinefunction(node):
+                @functools.wraps(node)
+                async def async_wrapper(state):
+                    span, token = self._start(name, state)
+                    try:
+                        result = await node(state)
+                    except Exception as e:
+                        self._finish(span, state, None, token, error=e)
+                        raise
+                    return self._finish(span, state, result, token)
+                return async_wrapper
+
+            @functools.wraps(node)
+            def wrapper(state):
+                span, token = self._start(name, state)
+                try:
+                    result = node(state)
+                except Exception as e:
+                    self._finish(span, state, None, token, error=e)
+                    raise
+                return self._finish(span, state, result, token)
+            return wrapper
+        return decorator
+
+    def _start(self, name: str, state: dict) -> tuple:
+        span = {
+            "trace_id": state.get("trace_id") or uuid.uuid4().hex,
+            "span_id": uuid.uuid4().hex[:16],
+            "name": f"node.{name}",
+            "start_time_unix_nano": time.time_ns(),
+            "attributes": {
+                "node": name,
+                "iteration": state.get("iteration_count", 0)
+            },
+            "_started": time.perf_counter()
+        }
+        return span, _current_span.set(span)
+
+    def _finish(self, span: dict, state: dict, result, token, error: Exception = None):
+        _current_span.reset(token)
+        attributes = span["attributes"]
+        attributes["wall_ms"] = (time.perf_counter() - span.pop("_started")) * 1000
+        span["end_time_unix_nano"] = time.time_ns()
+
+        attributes["state_bytes"] = state_size(state)
+        if result is not None:
+            attributes["update_bytes"] = state_size(result)
+            # Tokens of the LLM calls this node made
+            new_calls = (result.get("llm_calls") or [])[len(state.get("llm_calls") or []):]
+            if new_calls:
+                attributes["tokens_in"] = sum(call["input_tokens"] for call in new_calls)
+                attributes["tokens_out"] = sum(call["output_tokens"] for call in new_calls)
+                attributes["cost"] = sum(call["cost"] for call in new_calls)
+        if error is not None:
+            attributes["error"] = repr(error)
+        span["status"] = "ERROR" if error is not None else "OK"
+
+        self._record(span)
+
+        if result is None:
+            return None
+        record = {
+            key: round(value, 3) if key.endswith("_ms") else value
+            for key, value in attributes.items()
+        }
+        return {
+            **result,
+            "trace_id": span["trace_id"],
+            "trace": (state.get("trace") or []) + [record]
+        }
+
+    def _record(self, span: dict):
+        attributes = span["attributes"]
+        node = attributes["node"]
+        seconds = attributes["wall_ms"] / 1000
+
+        with self._lock:
+            histogram = self._durations.setdefault(node, [0] * (len(DURATION_BUCKETS) + 1) + [0.0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[len(DURATION_BUCKETS)] += 1
+            histogram[-1] += seconds
+
+            for metric, key in (
+                ("tokens_in_total", "tokens_in"),
+                ("tokens_out_total", "tokens_out"),
+                ("embed_seconds_total", "embed_ms"),
+                ("chroma_seconds_total", "chroma_ms"),
+                ("cost_usd_total", "cost"),
+                ("state_bytes_total", "state_bytes")
+            ):
+                value = attributes.get(key)
+                if value:
+                    scale = 1000 if key.endswith("_ms") else 1
+                    self._counters[(metric, node)] = self._counters.get((metric, node), 0) + value / scale
+            if attributes.get("cache_hit"):
+                self._counters[("cache_hits_total", node)] = self._counters.get(("cache_hits_total", node), 0) + 1
+            if span["status"] == "ERROR":
+                self._counters[("errors_total", node)] = self._counters.get(("errors_total", node), 0) + 1
+
+        if self.trace_path:
+            self._start_writer()
+            self._pending.put(span)
+
+    # -------------------------
+    # Trace file writer
+    # -------------------------
+
+    def _reset_writer(self):
+        self._pending = queue.Queue()
+        self._writer = None
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._drain, name="telemetry-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _drain(self):
+        while True:
+            spans = [self._pending.get()]
+            # Whatever queued up meanwhile goes out in the same write
+            while True:
+                try:
+                    spans.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(span, default=str) + "\n" for span in spans)
+            except OSError as e:
+                print(f"⚠️ Could not write traces to {self.trace_path}: {e}")
+            finally:
+                for _ in spans:
+                    self._pending.task_done()
+
+    def flush(self):
+        """Blocks until every recorded span is in the trace file."""
+        if self._writer is not None:
+            self._pending.join()
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP token_diet_node_duration_seconds Wall time per graph node",
+            "# TYPE token_diet_node_duration_seconds histogram"
+        ]
+        with self._lock:
+            for node, histogram in sorted(self._durations.items()):
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    lines.append(f'token_diet_node_duration_seconds_bucket{{node="{node}",le="{bound}"}} {count}')
+                total = histogram[len(DURATION_BUCKETS)]
+                lines.append(f'token_diet_node_duration_seconds_bucket{{node="{node}",le="+Inf"}} {total}')
+                lines.append(f'token_diet_node_duration_seconds_sum{{node="{node}"}} {histogram[-1]:.6f}')
+                lines.append(f'token_diet_node_duration_seconds_count{{node="{node}"}} {total}')
+
+            metrics = sorted({metric for metric, _ in self._counters})
+            for metric in metrics:
+                lines.append(f"# TYPE token_diet_node_{metric} counter")
+                for (name, node), value in sorted(self._counters.items()):
+                    if name == metric:
+                        lines.append(f'token_diet_node_{metric}{{node="{node}"}} {value:.6g}')
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide instance used by the graph
+telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    """Returns the shared telemetry recorder"""
+    return telemetry
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import tiktoken
+
+
+DEFAULT_MODEL = "gpt-4o"
+FALLBACK_ENCODING = "cl100k_base"
+
+
+class TokenCounter:
+    """
+    Shared token-counting service.
+
+    Keeps one tiktoken encoder per model resident and memoizes counts
+    keyed by a content hash, so the same document is only tokenized once
+    no matter how many nodes (or retries) ask for its size.
+    """
+
+    def __init__(self, max_entries: int = 4096, num_threads: int = None):
+        self.max_entries = max_entries
+        self.num_threads = num_threads or min(8, os.cpu_count() or 1)
+
+        self._encoders = {}
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_encoding(self, model: str = DEFAULT_MODEL):
+        """Returns the (cached) encoder for a model."""
+        encoding = self._encoders.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+            with self._lock:
+                encoding = self._encoders.setdefault(model, encoding)
+        return encoding
+
+    @staticmethod
+    def _key(text: str, model: str) -> tuple:
+        digest = hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        return (model, len(text), digest)
+
+    def _lookup(self, key: tuple):
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def _store(self, key: tuple, count: int):
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+    def count(self, text: str, model: str = DEFAULT_MODEL) -> int:
+        """Returns the number of tokens in a string."""
+        if not text:
+            return 0
+
+        key = self._key(text, model)
+        count = self._lookup(key)
+        if count is None:
+            count = len(self.get_encoding(model).encode(text))
+            self._store(key, count)
+        return count
+
+    def count_batch(self, texts: list[str], model: str = DEFAULT_MODEL) -> list[int]:
+        """
+        Counts many strings at once.
+        Cache misses are encoded together with tiktoken's threaded batch encoder.
+        """
+        counts = [0] * len(texts)
+        pending = {}
+
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            key = self._key(text, model)
+            count = self._lookup(key)
+            if count is None:
+                pending.setdefault(key, []).append(i)
+            else:
+                counts[i] = count
+
+        if pending:
+            keys = list(pending)
+            batch = [texts[pending[key][0]] for key in keys]
+            encoded = self.get_encoding(model).encode_batch(
+                batch, num_threads=self.num_threads
+            )
+            for key, tokens in zip(keys, encoded):
+                self._store(key, len(tokens))
+                for i in pending[key]:
+                    counts[i] = len(tokens)
+
+        return counts
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._counts)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Process-wide instance shared by the graph nodes, router and UI
+token_counter = TokenCounter()
+
+
+def get_token_counter() -> TokenCounter:
+    """Returns the shared token counter instance"""
+    return token_counter
@@ -0,0 +1,377 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, see SHARED_WRITES
+    fcntl = None
+
+# Smallest vector file allocated; it doubles whenever it fills up
+INITIAL_CAPACITY = 1024
+
+# Whether several processes may safely write one collection (needs flock)
+SHARED_WRITES = fcntl is not None
+
+
+class NumpyCollection:
+    """
+    In-process exact vector index with the subset of the Chroma collection
+    API the pruner uses (add/upsert/update/delete/get/query/count, `where`
+    filters with equality, `$in`, `$and` and `$or`).
+
+    Vectors live in one contiguous float32 `.npy` file, memory-mapped, so
+    the OS page cache holds a single copy however many readers map it.
+    Ids, metadata and documents live in a small SQLite file. A query is
+    one matrix product over the vector file (or over the filtered rows)
+    plus `argpartition` for the top-k; distances are squared L2, like
+    Chroma's default space.
+
+    Meant for small corpora (single-document sessions) where a Chroma
+    round-trip costs more than the search itself. Several processes
+    (API workers, the UI) may share a path: writes hold an exclusive
+    `flock` on `.lock` and reads a shared one, and each process reloads
+    its in-memory view whenever SQLite reports another process committed
+    (`PRAGMA data_version`), so appends never land on someone else's rows.
+    Deleted or replaced rows stay in the vector file until `compact()`,
+    which runs on its own once they outnumber the live rows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._lock_fd = os.open(os.path.join(path, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock_depth = 0
+        self._version = None
+        self._conn = sqlite3.connect(os.path.join(path, "records.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " id TEXT PRIMARY KEY,"
+            " row INTEGER NOT NULL,"
+            " document TEXT,"
+            " metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        # Records are loaded by the first locked call (see _sync)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "records.sqlite"))
+
+    @property
+    def dropped(self) -> bool:
+        """True once this collection's files are gone (e.g. another process moved it to Chroma)."""
+        return not self.exists(self.path)
+
+    # -------------------------
+    # Locking
+    # -------------------------
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Thread lock plus a cross-process flock; re-entrant, the outermost call picks the mode."""
+        with self._lock:
+            outermost = self._lock_depth == 0
+            if outermost and fcntl:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._lock_depth += 1
+            try:
+                if outermost:
+                    self._sync()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if outermost and fcntl:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _sync(self):
+        # data_version only moves when another connection (process) has committed
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._version:
+            self._load()
+
+    # -------------------------
+    # Storage
+    # -------------------------
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.npy")
+
+    def _load(self):
+        records = self._conn.execute("SELECT id, row, metadata FROM records").fetchall()
+        self._version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+        self._vectors = None        # memmap (capacity, dim); rows [0, _rows) are used
+        if os.path.exists(self._vectors_path):
+            self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+
+        self._ids = {record_id: row for record_id, row, _ in records}
+        self._row_ids = {row: record_id for record_id, row, _ in records}
+        self._metadata = {row: json.loads(metadata) for _, row, metadata in records}
+        self._rows = max(self._row_ids, default=-1) + 1
+
+        # Squared norm per used row; +inf marks a dead row so it never ranks
+        self._norms = np.full(self._rows, np.inf, dtype=np.float32)
+        if self._rows:
+            live = np.fromiter(self._row_ids, dtype=np.int64)
+            used = self._vectors[:self._rows]
+            self._norms[live] = np.einsum("ij,ij->i", used[live], used[live])
+        self._invalidate()
+
+    def _invalidate(self):
+        # Derived views, rebuilt lazily on the next read
+        self._live_rows = None
+        self._fields = {}
+
+    @property
+    def _live(self) -> np.ndarray:
+        if self._live_rows is None:
+            self._live_rows = np.flatnonzero(np.isfinite(self._norms))
+        return self._live_rows
+
+    def _ensure_capacity(self, dim: int, needed: int):
+        if self._vectors is None:
+            self._vectors = np.lib.format.open_memmap(
+                self._vectors_path, mode="w+", dtype=np.float32, shape=(max(INITIAL_CAPACITY, needed), dim)
+            )
+            return
+
+        if self._vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match collection dimension {self._vectors.shape[1]}")
+        if needed > self._vectors.shape[0]:
+            capacity = self._vectors.shape[0]
+            while capacity < needed:
+                capacity *= 2
+            self._rewrite(self._vectors[:self._rows], capacity)
+
+    def _rewrite(self, rows: np.ndarray, capacity: int):
+        """Writes `rows` into a fresh vector file of `capacity` rows and swaps it in."""
+        staged = self._vectors_path + ".tmp"
+        vectors = np.lib.format.open_memmap(staged, mode="w+", dtype=np.float32, shape=(capacity, rows.shape[1]))
+        vectors[:len(rows)] = rows
+        vectors.flush()
+        del vectors
+        self._vectors = None
+        os.replace(staged, self._vectors_path)
+        self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+
+    # -------------------------
+    # Writes
+    # -------------------------
+
+    def add(self, ids: list, embeddings: list, documents: list = None, metadatas: list = None):
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids: list, embeddings: list, documents: list = None, metadatas: list = None):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+
+        with self._locked(exclusive=True):
+            self._ensure_capacity(vectors.shape[1], self._rows + len(ids))
+            start = self._rows
+            for record_id in ids:
+                old = self._ids.get(record_id)
+                if old is not None:
+                    self._norms[old] = np.inf
+                    del self._row_ids[old], self._metadata[old]
+
+            rows = range(start, start + len(ids))
+            self._vectors[start:start + len(ids)] = vectors
+            self._vectors.flush()
+            self._norms = np.concatenate([self._norms, np.einsum("ij,ij->i", vectors, vectors)])
+            self._rows += len(ids)
+
+            for row, record_id, metadata in zip(rows, ids, metadatas):
+                self._ids[record_id] = row
+                self._row_ids[row] = record_id
+                self._metadata[row] = metadata or {}
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (record_id, row, document, json.dumps(metadata or {}))
+                    for row, record_id, document, metadata in zip(rows, ids, documents, metadatas)
+                ]
+            )
+            self._conn.commit()
+            self._invalidate()
+
+    def update(self, ids: list, metadatas: list = None, embeddings: list = None, documents: list = None):
+        with self._locked(exclusive=True):
+            for i, record_id in enumerate(ids):
+                row = self._ids.get(record_id)
+                if row is None:
+                    continue
+                if metadatas is not None:
+                    self._metadata[row] = metadatas[i] or {}
+                    self._conn.execute(
+                        "UPDATE records SET metadata = ? WHERE id = ?", (json.dumps(metadatas[i] or {}), record_id)
+                    )
+                if documents is not None:
+                    self._conn.execute("UPDATE records SET document = ? WHERE id = ?", (documents[i], record_id))
+                if embeddings is not None:
+                    vector = np.asarray(embeddings[i], dtype=np.float32)
+                    self._vectors[row] = vector
+                    self._norms[row] = vector @ vector
+            if embeddings is not None:
+                self._vectors.flush()
+            self._conn.commit()
+            self._invalidate()
+
+    def delete(self, ids: list = None, where: dict = None):
+        with self._locked(exclusive=True):
+            rows = {self._ids[record_id] for record_id in ids or [] if record_id in self._ids}
+            if where is not None:
+                rows.update(int(row) for row in self._live[self._mask(where)])
+            if not rows:
+                return
+
+            doomed = []
+            for row in rows:
+                doomed.append(self._row_ids.pop(row))
+                del self._ids[doomed[-1]], self._metadata[row]
+                self._norms[row] = np.inf
+            for start in range(0, len(doomed), 500):
+                batch = doomed[start:start + 500]
+                self._conn.execute(f"DELETE FROM records WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+            self._invalidate()
+
+            if self._rows - len(self._ids) > max(len(self._ids), INITIAL_CAPACITY):
+                self.compact()
+
+    def compact(self):
+        """Rewrites the vector file without dead rows."""
+        with self._locked(exclusive=True):
+            live = self._live
+            if self._vectors is None or len(live) == self._rows:
+                return
+            kept = self._vectors[live]
+            self._conn.executemany(
+                "UPDATE records SET row = ? WHERE id = ?",
+                [(new, self._row_ids[int(old)]) for new, old in enumerate(live)]
+            )
+            self._conn.commit()
+            self._rewrite(kept, max(INITIAL_CAPACITY, len(kept)))
+            self._load()
+
+    def drop(self):
+        """Deletes the collection's files."""
+        with self._locked(exclusive=True):
+            self._conn.close()
+            self._vectors = None
+            shutil.rmtree(self.path, ignore_errors=True)
+        os.close(self._lock_fd)
+
+    # -------------------------
+    # Reads
+    # -------------------------
+
+    def count(self) -> int:
+        with self._locked(exclusive=False):
+            return len(self._ids)
+
+    def _field(self, name: str) -> np.ndarray:
+        values = self._fields.get(name)
+        if values is None:
+            values = np.array([self._metadata[int(row)].get(name) for row in self._live], dtype=object)
+            self._fields[name] = values
+        return values
+
+    def _mask(self, where: dict) -> np.ndarray:
+        """Boolean mask over live rows for a Chroma-style `where` filter."""
+        mask = np.ones(len(self._live), dtype=bool)
+        for key, condition in (where or {}).items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._mask(clause)
+            elif key == "$or":
+                mask &= np.logical_or.reduce([self._mask(clause) for clause in condition])
+            elif isinstance(condition, dict) and "$in" in condition:
+                mask &= np.isin(self._field(key), list(condition["$in"]))
+            elif isinstance(condition, dict) and "$eq" in condition:
+                mask &= self._field(key) == condition["$eq"]
+            else:
+                mask &= self._field(key) == condition
+        return mask
+
+    def _documents(self, record_ids: list) -> dict:
+        found = {}
+        for start in range(0, len(record_ids), 500):
+            batch = record_ids[start:start + 500]
+            found.update(self._conn.execute(
+                f"SELECT id, document FROM records WHERE id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return found
+
+    def _records(self, rows: list, include) -> dict:
+        record_ids = [self._row_ids[row] for row in rows]
+        result = {"ids": record_ids}
+        if "documents" in include:
+            documents = self._documents(record_ids)
+            result["documents"] = [documents.get(record_id) for record_id in record_ids]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadata[row] for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [self._vectors[row].tolist() for row in rows]
+        return result
+
+    def get(self, ids: list = None, where: dict = None, include=("documents", "metadatas"), **_) -> dict:
+        with self._locked(exclusive=False):
+            if ids is not None:
+                rows = [self._ids[record_id] for record_id in ids if record_id in self._ids]
+            else:
+                rows = [int(row) for row in self._live[self._mask(where)]]
+            return self._records(rows, include)
+
+    def query(
+        self,
+        query_embeddings: list,
+        n_results: int = 10,
+        where: dict = None,
+        include=("documents", "metadatas", "distances"),
+        **_
+    ) -> dict:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        keys = ["ids"] + [key for key in ("documents", "metadatas", "distances", "embeddings") if key in include]
+        result = {key: [] for key in keys}
+
+        with self._locked(exclusive=False):
+            live = self._live
+            mask = self._mask(where)
+            selected = int(mask.sum())
+            if selected == 0:
+                return {key: [[] for _ in queries] for key in keys}
+
+            if selected == len(live):
+                # Unfiltered: scan the mapped file in place, dead rows score +inf
+                rows = None
+                matrix, norms = self._vectors[:self._rows], self._norms
+            else:
+                rows = live[mask]
+                matrix, norms = self._vectors[rows], self._norms[rows]
+
+            # |a - q|^2 = |a|^2 - 2 a.q + |q|^2
+            distances = norms[None, :] - 2 * (queries @ matrix.T) + np.einsum("ij,ij->i", queries, queries)[:, None]
+            k = min(n_results, selected)
+
+            for q in range(len(queries)):
+                top = np.argpartition(distances[q], k - 1)[:k] if k < distances.shape[1] else np.arange(distances.shape[1])
+                top = top[np.argsort(distances[q][top])][:k]
+                found = [int(i) for i in top] if rows is None else [int(rows[i]) for i in top]
+                records = self._records(found, include)
+                for key in keys:
+                    if key == "distances":
+                        result[key].append([max(float(distances[q][i]), 0.0) for i in top])
+                    else:
+                        result[key].append(records[key])
+        return result
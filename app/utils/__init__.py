@@ -1,18 +1,18 @@
-import tiktoken
+from app.services.model_registry import model_registry
+from app.services.token_counter import token_counter
+
 
 def count_tokens(text: str, model: str = "gpt-4o") -> int:
-    """Returns the number of tokens in a string."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(text))
+    """Returns the number of tokens in a string (cached by content hash)."""
+    return token_counter.count(text, model)
+
+def count_tokens_batch(texts: list[str], model: str = "gpt-4o") -> list[int]:
+    """Returns the number of tokens for each string, batch-encoding cache misses."""
+    return token_counter.count_batch(texts, model)
 
-def calculate_cost(tokens: int, model: str) -> float:
-    """Calculates approximate cost in USD."""
-    # Prices per 1M tokens (Approx 2026 rates)
-    prices = {
-        "gpt-4o-mini": 0.15 / 1_000_000,
-        "gpt-4o": 2.50 / 1_000_000
-    }
-    return tokens * prices.get(model, 0)
+def calculate_cost(tokens: int, model: str, output_tokens: int = 0) -> float:
+    """Cost in USD of `tokens` input (and `output_tokens` output) tokens, priced from config/models.json."""
+    spec = model_registry.get(model)
+    if spec is None:
+        raise KeyError(f"No price for model '{model}' in the model registry")
+    return spec.cost(tokens, output_tokens)
@@ -1,20 +1,123 @@
+import codecs
+import hashlib
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
 from pypdf import PdfReader
 
 
-def extract_text_from_file(uploaded_file) -> str:
+# Pages handed to a worker per task; small enough to keep results flowing early
+PAGES_PER_TASK = 8
+# Below this many pages a process pool costs more than it saves
+MIN_PAGES_FOR_POOL = 32
+# Text files are decoded in blocks of this many bytes
+TEXT_BLOCK_SIZE = 1 << 20
+
+_worker_reader = None
+
+
+def _init_pdf_worker(data: bytes):
+    # Each worker parses the PDF once and then serves page ranges from it
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(data))
+
+
+def _extract_page_range(page_range: tuple) -> list[str]:
+    start, end = page_range
+    return [
+        _worker_reader.pages[i].extract_text() or ""
+        for i in range(start, end)
+    ]
+
+
+def _iter_pdf_pages(data: bytes, max_workers: int = None) -> Iterator[str]:
+    reader = PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+
+    if page_count < MIN_PAGES_FOR_POOL:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    del reader
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    ranges = deque(
+        (start, min(start + PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PAGES_PER_TASK)
+    )
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_pdf_worker,
+        initargs=(data,)
+    ) as pool:
+        # Keep a bounded window of tasks in flight so finished pages never pile up
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < max_workers * 2:
+                in_flight.append(pool.submit(_extract_page_range, ranges.popleft()))
+            yield from in_flight.popleft().result()
+
+
+def _iter_text_blocks(uploaded_file) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        block = uploaded_file.read(TEXT_BLOCK_SIZE)
+        if not block:
+            break
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class UploadedBytes(io.BytesIO):
+    """An in-memory upload (same interface as Streamlit's UploadedFile) that outlives the script run."""
+
+    def __init__(self, data: bytes, name: str, type: str):
+        super().__init__(data)
+        self.name = name
+        self.type = type
+
+
+def file_fingerprint(data: bytes) -> str:
+    """Content id of an uploaded file's raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def count_pages(data: bytes, file_type: str) -> int:
+    """How many items iter_pages_from_file will yield (PDF pages or text blocks)."""
+    if file_type == "application/pdf":
+        return len(PdfReader(io.BytesIO(data)).pages)
+    return max(1, -(-len(data) // TEXT_BLOCK_SIZE))
+
+
+def iter_pages_from_file(uploaded_file, max_workers: int = None) -> Iterator[str]:
     """
-    Extracts text from uploaded PDF or TXT file.
+    Streams text out of an uploaded PDF or TXT file.
+    PDFs yield one string per page (extracted in a process pool for large files),
+    text files yield decoded blocks, so callers never need the whole document at once.
     """
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
 
     if uploaded_file.type == "application/pdf":
-        reader = PdfReader(uploaded_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-        return text
+        yield from _iter_pdf_pages(uploaded_file.read(), max_workers=max_workers)
 
     elif uploaded_file.type == "text/plain":
-        return uploaded_file.read().decode("utf-8")
+        yield from _iter_text_blocks(uploaded_file)
 
     else:
         raise ValueError("Unsupported file type")
+
+
+def extract_text_from_file(uploaded_file) -> str:
+    """
+    Extracts text from uploaded PDF or TXT file.
+    """
+    return "".join(iter_pages_from_file(uploaded_file))
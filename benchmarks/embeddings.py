@@ -0,0 +1,160 @@
+"""
+Embedding backend comparison: throughput, query latency, memory and
+recall@k against a reference backend.
+
+Every backend embeds the same chunks of a seeded synthetic corpus and the
+same questions. Recall@k is the overlap of each backend's exact top-k
+chunks (cosine, over its own vectors) with the reference backend's top-k.
+
+Usage:
+    python benchmarks/embeddings.py [--backends hf,onnx,onnx-int8,torch-int8] [--size 1MB]
+                                    [--k 10] [--threads 4] [--batch-size 64] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.suite import SyntheticCorpus, parse_size, percentile  # noqa: E402
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), or 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        return 0.0
+
+
+def normalized(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / (np.linalg.norm(matrix, axis=-1, keepdims=True) + 1e-12)
+
+
+def top_k(chunks: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ chunks.T
+    k = min(k, chunks.shape[0])
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def bench_backend(name: str, chunks: list[str], questions: list[str], args) -> dict:
+    from app.services.embeddings import get_embedding_backend
+
+    before = rss_mb()
+    started = time.perf_counter()
+    backend = get_embedding_backend(name, batch_size=args.batch_size, threads=args.threads)
+    load_s = time.perf_counter() - started
+    memory_mb = rss_mb() - before
+
+    backend.embed_documents(chunks[:args.batch_size or 32])  # Warm-up
+    started = time.perf_counter()
+    chunk_vectors = backend.embed_documents(chunks)
+    embed_s = time.perf_counter() - started
+
+    query_ms, query_vectors = [], []
+    for question in questions:
+        started = time.perf_counter()
+        query_vectors.append(backend.embed_query(question))
+        query_ms.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "signature": backend.signature(),
+        "load_s": round(load_s, 2),
+        "memory_mb": round(memory_mb, 1),
+        "chunks_per_s": round(len(chunks) / embed_s, 1),
+        "query_p50_ms": round(percentile(query_ms, 50), 2),
+        "query_p99_ms": round(percentile(query_ms, 99), 2),
+        "_chunks": normalized(chunk_vectors),
+        "_queries": normalized(query_vectors)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="hf,onnx,onnx-int8,torch-int8")
+    parser.add_argument("--reference", default="hf", help="backend whose top-k counts as ground truth")
+    parser.add_argument("--size", default="1MB", help="synthetic corpus size")
+    parser.add_argument("--max-chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    from app.services.chunker import get_chunker
+
+    corpus = SyntheticCorpus(parse_size(args.size), seed=args.seed)
+    chunks = []
+    for chunk in get_chunker().stream(corpus.pages()):
+        chunks.append(chunk.text)
+        if len(chunks) >= args.max_chunks:
+            break
+    questions = corpus.questions(args.queries)
+
+    backends = [name for name in args.backends.split(",") if name]
+    if args.reference not in backends:
+        backends.insert(0, args.reference)
+
+    results = {}
+    for name in backends:
+        try:
+            results[name] = bench_backend(name, chunks, questions, args)
+        except ImportError as e:
+            results[name] = {"error": f"not installed: {e}"}
+        except Exception as e:
+            results[name] = {"error": str(e)}
+
+    reference = results.get(args.reference, {})
+    if "_chunks" in reference:
+        truth = top_k(reference["_chunks"], reference["_queries"], args.k)
+        for name, result in results.items():
+            if "_chunks" not in result:
+                continue
+            found = top_k(result["_chunks"], result["_queries"], args.k)
+            overlap = [len(set(a) & set(b)) / truth.shape[1] for a, b in zip(truth, found)]
+            result[f"recall_at_{args.k}"] = round(float(np.mean(overlap)), 4)
+            if result["_chunks"].shape == reference["_chunks"].shape:
+                # How close each chunk's vector stays to the reference vector
+                agreement = (result["_chunks"] * reference["_chunks"]).sum(axis=1)
+                result["mean_cosine_to_reference"] = round(float(agreement.mean()), 4)
+
+    for result in results.values():
+        result.pop("_chunks", None)
+        result.pop("_queries", None)
+
+    if args.json:
+        print(json.dumps({
+            "corpus": args.size,
+            "chunks": len(chunks),
+            "queries": len(questions),
+            "k": args.k,
+            "reference": args.reference,
+            "results": results
+        }, indent=2))
+        return
+
+    print(f"🧮 {len(chunks)} chunks, {len(questions)} queries, recall@{args.k} vs '{args.reference}'")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"  {name:<11} ⚠️  {result['error']}")
+            continue
+        print(
+            f"  {name:<11} {result['chunks_per_s']:8.1f} chunks/s  "
+            f"query p50 {result['query_p50_ms']:6.2f} ms  "
+            f"recall {result.get(f'recall_at_{args.k}', 0):.3f}  "
+            f"load {result['load_s']:.1f}s  +{result['memory_mb']:.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
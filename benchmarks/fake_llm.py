@@ -0,0 +1,134 @@
+"""
+Deterministic offline stand-in for ChatGroq, so benchmarks need neither
+network access nor a GROQ_API_KEY.
+
+- Executor calls answer with the first sentences of the context they were
+  given. On the cheapest tier a fixed fraction of questions (chosen by a
+  hash of the question, so the same ones every run) get "Information not
+  available." instead, which the judge rejects and the graph retries.
+- Judge calls answer "8".
+- Latency is simulated: `ttft_ms` before the first token, then
+  `tokens_per_s` for the output. Usage metadata is filled in, so cost
+  accounting works as with the real API.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.services.judge import JUDGE_PROMPT
+from app.utils import count_tokens, count_tokens_batch
+
+REFUSAL = "Information not available."
+
+
+class FakeChatModel(BaseChatModel):
+    model_name: str = "fake"
+    ttft_ms: float = 50.0
+    tokens_per_s: float = 500.0
+    reject_rate: float = 0.0
+    answer_sentences: int = 3
+
+    @property
+    def _llm_type(self) -> str:
+        return "token-diet-fake"
+
+    # -------------------------
+    # Deterministic replies
+    # -------------------------
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        if messages and messages[0].content == JUDGE_PROMPT:
+            return "8"
+
+        human = str(messages[-1].content)
+        question = human.rsplit("Question:\n", 1)[-1].strip()
+        bucket = int(hashlib.sha256(question.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if bucket < self.reject_rate and "An earlier answer" not in human:
+            return REFUSAL
+
+        context = human.split("\n\n", 1)[0].split(":\n", 1)[-1]
+        sentences = re.split(r"(?<=[.!?])\s+", context.strip())
+        return " ".join(sentences[:self.answer_sentences]) or REFUSAL
+
+    def _usage(self, messages: List[BaseMessage], reply: str) -> dict:
+        input_tokens = sum(count_tokens_batch([str(message.content) for message in messages]))
+        output_tokens = count_tokens(reply)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
+
+    def _delay_s(self, reply: str) -> float:
+        return self.ttft_ms / 1000 + count_tokens(reply) / self.tokens_per_s
+
+    # -------------------------
+    # BaseChatModel hooks
+    # -------------------------
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        reply = self._reply(messages)
+        time.sleep(self._delay_s(reply))
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        reply = self._reply(messages)
+        await asyncio.sleep(self._delay_s(reply))
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages: List[BaseMessage]):
+        reply = self._reply(messages)
+        words = reply.split(" ")
+        usage = self._usage(messages, reply)
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=word if last else word + " ",
+                usage_metadata=usage if last else None
+            )), count_tokens(word)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        time.sleep(self.ttft_ms / 1000)
+        for chunk, tokens in self._chunks(messages):
+            time.sleep(tokens / self.tokens_per_s)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self.ttft_ms / 1000)
+        for chunk, tokens in self._chunks(messages):
+            await asyncio.sleep(tokens / self.tokens_per_s)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def install_fake_llm(ttft_ms: float = 50.0, tokens_per_s: float = 500.0, reject_rate: float = 0.0) -> list:
+    """
+    Registers a FakeChatModel for every model in the registry with the
+    shared LLM pool. `reject_rate` applies to the cheapest tier only.
+    Returns the names of the models replaced.
+    """
+    from app.services.llm_pool import llm_pool
+    from app.services.model_registry import model_registry
+
+    models = model_registry.models()
+    cheapest_tier = models[0].tier
+    for spec in models:
+        llm_pool.register(spec.name, FakeChatModel(
+            model_name=spec.name,
+            ttft_ms=ttft_ms,
+            tokens_per_s=tokens_per_s,
+            reject_rate=reject_rate if spec.tier == cheapest_tier else 0.0
+        ))
+    return [spec.name for spec in models]
@@ -0,0 +1,106 @@
+"""
+Import-time budget for `app.agents.graph`.
+
+Runs `python -X importtime -c "import app.agents.graph"` in fresh
+interpreters, reports the median wall time and the slowest modules, and
+fails if the budget is exceeded or if a heavy dependency (embedding model,
+vector store, LLM SDK) gets imported eagerly.
+
+Usage:
+    python benchmarks/import_time.py [--runs 5] [--budget-ms 800] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET = "app.agents.graph"
+
+# Must only be loaded on first use, never at import
+HEAVY_MODULES = [
+    "chromadb",
+    "sentence_transformers",
+    "onnxruntime",
+    "torch",
+    "langchain_huggingface",
+    "langchain_groq",
+    "groq",
+    "langchain_core",
+    "langgraph.graph"
+]
+
+
+def run_once(target: str) -> dict:
+    probe = (
+        f"import sys, json; import {target}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{result.stderr[-2000:]}")
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    return {
+        "wall_s": wall,
+        "heavy_loaded": json.loads(result.stdout.strip().splitlines()[-1]),
+        "modules": modules
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("TOKEN_DIET_IMPORT_BUDGET_MS", "800")))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    runs = [run_once(TARGET) for _ in range(args.runs)]
+    median_ms = statistics.median(run["wall_s"] for run in runs) * 1000
+    heavy = sorted({name for run in runs for name in run["heavy_loaded"]})
+    slowest = sorted(runs[-1]["modules"], key=lambda m: m[2], reverse=True)[:args.top]
+    ok = median_ms <= args.budget_ms and not heavy
+
+    if args.json:
+        print(json.dumps({
+            "target": TARGET,
+            "runs": args.runs,
+            "median_ms": round(median_ms, 1),
+            "budget_ms": args.budget_ms,
+            "heavy_loaded": heavy,
+            "slowest": [{"module": n, "self_us": s, "cumulative_us": c} for n, s, c in slowest],
+            "ok": ok
+        }, indent=2))
+    else:
+        print(f"⏱️  import {TARGET}: median {median_ms:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+        print("Slowest modules (cumulative):")
+        for name, _, cumulative in slowest:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        if heavy:
+            print(f"❌ Heavy modules imported eagerly: {', '.join(heavy)}")
+        print("✅ Within budget" if ok else "❌ Over budget")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
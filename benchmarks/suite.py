@@ -0,0 +1,309 @@
+"""
+Reproducible benchmark suite for the agent pipeline.
+
+ChatGroq is replaced by a deterministic local stand-in
+(`benchmarks/fake_llm.py`) with configurable latency, so runs need no API
+key and only measure our own code: embedding, Chroma, BM25, packing and
+the graph. Every corpus is generated from a fixed seed.
+
+Per corpus size it reports:
+- ingest throughput (chunks/s, MB/s)
+- prune node latency (p50/p99)
+- end-to-end graph latency (p50/p99), tokens per answer, retry rate and
+  mean agent-state size per graph step
+
+Usage:
+    python benchmarks/suite.py run [--sizes 10KB,1MB] [--profile full] [--output results.json]
+    python benchmarks/suite.py compare baseline.json candidate.json [--threshold 0.1]
+
+`run` writes JSON to benchmarks/results/ by default. `compare` prints a
+markdown table (paste it into the PR) and exits 1 when any metric got
+worse than the threshold.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+PROFILES = {
+    "quick": "10KB,100KB,1MB",
+    "full": "10KB,1MB,10MB,100MB"
+}
+
+TENANT = "bench"
+
+# metric -> which direction is better
+METRICS = {
+    "ingest_chunks_per_s": "higher",
+    "ingest_mb_per_s": "higher",
+    "prune_p50_ms": "lower",
+    "prune_p99_ms": "lower",
+    "graph_p50_ms": "lower",
+    "graph_p99_ms": "lower",
+    "tokens_per_answer": "lower",
+    "retry_rate": "lower",
+    "state_kb_per_step": "lower"
+}
+
+
+def parse_size(label: str) -> int:
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+    label = label.strip().upper()
+    for unit, factor in units.items():
+        if label.endswith(unit):
+            return int(float(label[:-len(unit)]) * factor)
+    return int(label)
+
+
+def percentile(values: list, q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+# -------------------------
+# Synthetic corpora
+# -------------------------
+
+class SyntheticCorpus:
+    """
+    Seeded prose with one retrievable fact per few paragraphs
+    ("Project <name> was approved by <person> in <year>."), so every
+    benchmark question has a known answer somewhere in the corpus.
+    """
+
+    def __init__(self, size_bytes: int, seed: int = 0, page_bytes: int = 64 * 1024):
+        self.size_bytes = size_bytes
+        self.seed = seed
+        self.page_bytes = page_bytes
+
+        rng = random.Random(seed)
+        syllables = ["ka", "lo", "mi", "ra", "ten", "vo", "shi", "dan", "el", "por", "qu", "zi", "bar", "ne", "tor"]
+        self.words = sorted({
+            "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(3000)
+        })
+        self.facts = []
+
+    def _paragraph(self, rng: random.Random) -> str:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            words = [rng.choice(self.words) for _ in range(rng.randint(8, 20))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        if rng.random() < 0.3:
+            project = f"{rng.choice(self.words).capitalize()}-{rng.randint(100, 999)}"
+            person = f"{rng.choice(self.words).capitalize()} {rng.choice(self.words).capitalize()}"
+            year = rng.randint(1990, 2030)
+            self.facts.append((project, person, year))
+            sentences.insert(rng.randrange(len(sentences) + 1), f"Project {project} was approved by {person} in {year}.")
+        return " ".join(sentences)
+
+    def pages(self):
+        """Yields ~page_bytes pages until size_bytes is reached (deterministic)."""
+        rng = random.Random(self.seed + 1)
+        self.facts = []
+        written = 0
+        while written < self.size_bytes:
+            paragraphs, page_size = [], 0
+            while page_size < self.page_bytes and written + page_size < self.size_bytes:
+                paragraph = self._paragraph(rng)
+                paragraphs.append(paragraph)
+                page_size += len(paragraph) + 2
+            page = "\n\n".join(paragraphs) + "\n\n"
+            written += len(page)
+            yield page
+
+    def questions(self, n: int) -> list[str]:
+        rng = random.Random(self.seed + 2)
+        facts = rng.sample(self.facts, min(n, len(self.facts)))
+        return [f"Who approved project {project}, and in which year?" for project, _, _ in facts]
+
+
+# -------------------------
+# Benchmarks
+# -------------------------
+
+def bench_corpus(label: str, args) -> dict:
+    from app.agents.graph import build_agent_graph, get_pruner, prune_node
+    from app.agents.state import initial_state
+
+    corpus = SyntheticCorpus(parse_size(label), seed=args.seed)
+    doc_id = f"corpus-{label}"
+    pruner = get_pruner()
+
+    started = time.perf_counter()
+    stats = pruner.ingest_stream(corpus.pages(), doc_id=doc_id, tenant_id=TENANT)
+    ingest_s = time.perf_counter() - started
+
+    questions = corpus.questions(args.queries)
+
+    prune_ms = []
+    for question in questions:
+        started = time.perf_counter()
+        prune_node(initial_state(question, None, tenant_id=TENANT, doc_ids=[doc_id]))
+        prune_ms.append((time.perf_counter() - started) * 1000)
+
+    agent = build_agent_graph()
+    graph_ms, answer_tokens, state_bytes, retries = [], [], [], 0
+    for question in questions:
+        started = time.perf_counter()
+        final = agent.invoke(initial_state(question, None, tenant_id=TENANT, doc_ids=[doc_id]))
+        graph_ms.append((time.perf_counter() - started) * 1000)
+        answer_tokens.append(sum(call["input_tokens"] + call["output_tokens"] for call in final.get("llm_calls") or []))
+        state_bytes.extend(span.get("state_bytes", 0) for span in final.get("trace") or [])
+        retries += final.get("iteration_count", 0) > 1
+
+    megabytes = corpus.size_bytes / 1024 ** 2
+    return {
+        "size_bytes": corpus.size_bytes,
+        "chunks": stats["chunks"],
+        "questions": len(questions),
+        "ingest_s": round(ingest_s, 3),
+        "ingest_chunks_per_s": round(stats["chunks"] / ingest_s, 2),
+        "ingest_mb_per_s": round(megabytes / ingest_s, 4),
+        "prune_p50_ms": round(percentile(prune_ms, 50), 2),
+        "prune_p99_ms": round(percentile(prune_ms, 99), 2),
+        "graph_p50_ms": round(percentile(graph_ms, 50), 2),
+        "graph_p99_ms": round(percentile(graph_ms, 99), 2),
+        "tokens_per_answer": round(float(np.mean(answer_tokens)), 1) if answer_tokens else 0.0,
+        "retry_rate": round(retries / len(questions), 3) if questions else 0.0,
+        "state_kb_per_step": round(float(np.mean(state_bytes)) / 1024, 2) if state_bytes else 0.0
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def run(args) -> int:
+    sizes = [size for size in (args.sizes or PROFILES[args.profile]).split(",") if size.strip()]
+    revision = git_revision()
+    # Resolved before the chdir below, so a relative --output lands where the user ran the command
+    output = os.path.abspath(args.output) if args.output else os.path.join(
+        REPO_ROOT, "benchmarks", "results",
+        f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%SZ}-{revision}.json"
+    )
+
+    # Every run starts from empty indexes and caches in a scratch directory
+    workdir = tempfile.mkdtemp(prefix="token-diet-bench-")
+    os.chdir(workdir)
+    os.environ.setdefault("TOKEN_DIET_TRACE_FILE", "")
+
+    from benchmarks.fake_llm import install_fake_llm
+    install_fake_llm(ttft_ms=args.llm_ttft_ms, tokens_per_s=args.llm_tokens_per_s, reject_rate=args.reject_rate)
+
+    results = {}
+    for label in sizes:
+        print(f"⏱️  {label} ...", flush=True)
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            results[label] = bench_corpus(label, args)
+        r = results[label]
+        print(
+            f"   ingest {r['ingest_chunks_per_s']:.0f} chunks/s ({r['ingest_mb_per_s']:.2f} MB/s), "
+            f"prune p50/p99 {r['prune_p50_ms']:.1f}/{r['prune_p99_ms']:.1f} ms, "
+            f"graph p50/p99 {r['graph_p50_ms']:.0f}/{r['graph_p99_ms']:.0f} ms, "
+            f"{r['tokens_per_answer']:.0f} tokens/answer, retry rate {r['retry_rate']:.0%}, "
+            f"state {r['state_kb_per_step']:.1f} KB/step"
+        )
+
+    report = {
+        "meta": {
+            "revision": revision,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "queries": args.queries,
+            "llm": {
+                "ttft_ms": args.llm_ttft_ms,
+                "tokens_per_s": args.llm_tokens_per_s,
+                "reject_rate": args.reject_rate
+            }
+        },
+        "results": results
+    }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {output}")
+    return 0
+
+
+# -------------------------
+# Comparison
+# -------------------------
+
+def compare(args) -> int:
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, "r", encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"Baseline {baseline['meta']['revision']} vs candidate {candidate['meta']['revision']} "
+          f"(regression threshold {args.threshold:.0%})\n")
+    print("| corpus | metric | baseline | candidate | change | |")
+    print("|---|---|---:|---:|---:|---|")
+
+    regressions = 0
+    for label, base in baseline["results"].items():
+        current = candidate["results"].get(label)
+        if current is None:
+            continue
+        for metric, better in METRICS.items():
+            before, after = base.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else (0.0 if after == before else float("inf"))
+            worse = change > args.threshold if better == "lower" else change < -args.threshold
+            regressions += worse
+            flag = "❌" if worse else ("✅" if abs(change) > args.threshold else "")
+            print(f"| {label} | {metric} | {before:g} | {after:g} | {change:+.1%} | {flag} |")
+
+    print(f"\n{'❌ ' + str(regressions) + ' regression(s)' if regressions else '✅ No regressions'}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite and write JSON results")
+    run_parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    run_parser.add_argument("--sizes", help="comma-separated corpus sizes, e.g. 10KB,1MB,100MB (overrides --profile)")
+    run_parser.add_argument("--queries", type=int, default=20, help="questions per corpus")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--llm-ttft-ms", type=float, default=50.0)
+    run_parser.add_argument("--llm-tokens-per-s", type=float, default=500.0)
+    run_parser.add_argument("--reject-rate", type=float, default=0.2, help="share of questions the cheapest tier fails")
+    run_parser.add_argument("--output")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == "run" else compare(args))
+
+
+if __name__ == "__main__":
+    main()
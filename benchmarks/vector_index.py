@@ -0,0 +1,135 @@
+"""
+NumPy vs Chroma vector index: where is the crossover?
+
+For each corpus size, both indexes are built the way ingestion builds
+them (batches of `--batch-size`), then reopened cold and queried with a
+single-document filter, like the prune node does. Vectors are random
+unit vectors of the embedding model's size, so no model is loaded.
+
+Reports per size and backend: build time, cold open + first query, query
+p50/p99, and Chroma's recall@k against the exact NumPy result. The
+crossover is the first size at which Chroma's p50 query beats NumPy's.
+On a single-vCPU Linux box there was none up to 100k chunks (NumPy 4.8 ms
+vs Chroma 116 ms p50 at 20k, 13.4 ms vs 237 ms at 50k, 26.5 ms vs 571 ms
+at 100k), so the default
+TOKEN_DIET_NUMPY_MAX_CHUNKS of 50000 is set by the cold-load column and
+vector memory instead; lower it if either is too much for your host.
+
+Usage:
+    python benchmarks/vector_index.py [--sizes 1000,5000,20000,50000,100000] [--dim 384] [--json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.suite import percentile  # noqa: E402
+
+
+def open_index(backend: str, path: str):
+    if backend == "numpy":
+        from app.services.vector_index import NumpyCollection
+        return NumpyCollection(os.path.join(path, "vectors"))
+
+    import chromadb
+    return chromadb.PersistentClient(path=path).get_or_create_collection(name="benchmark")
+
+
+def bench(backend: str, vectors: np.ndarray, queries: np.ndarray, args) -> dict:
+    path = tempfile.mkdtemp(prefix=f"token-diet-{backend}-")
+    docs = max(1, args.documents)
+    try:
+        index = open_index(backend, path)
+        started = time.perf_counter()
+        for start in range(0, len(vectors), args.batch_size):
+            end = min(start + args.batch_size, len(vectors))
+            index.add(
+                ids=[f"doc{i % docs}:{i}" for i in range(start, end)],
+                embeddings=vectors[start:end].tolist(),
+                documents=[f"chunk {i}" for i in range(start, end)],
+                metadatas=[{"doc_id": f"doc{i % docs}", "position": i // docs} for i in range(start, end)]
+            )
+        build_s = time.perf_counter() - started
+        del index
+
+        where = {"doc_id": "doc0"}
+        started = time.perf_counter()
+        index = open_index(backend, path)
+        index.query(query_embeddings=[queries[0].tolist()], n_results=args.k, where=where)
+        cold_ms = (time.perf_counter() - started) * 1000
+
+        latencies, found = [], []
+        for query in queries:
+            started = time.perf_counter()
+            result = index.query(query_embeddings=[query.tolist()], n_results=args.k, where=where, include=[])
+            latencies.append((time.perf_counter() - started) * 1000)
+            found.append(result["ids"][0])
+
+        return {
+            "build_s": round(build_s, 3),
+            "cold_query_ms": round(cold_ms, 2),
+            "query_p50_ms": round(percentile(latencies, 50), 3),
+            "query_p99_ms": round(percentile(latencies, 99), 3),
+            "_found": found
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,5000,20000,50000,100000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--documents", type=int, default=1, help="documents the chunks are spread over")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results, crossover = {}, None
+    for size in [int(size) for size in args.sizes.split(",") if size]:
+        vectors = rng.normal(size=(size, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+        exact = bench("numpy", vectors, queries, args)
+        approximate = bench("chroma", vectors, queries, args)
+        recall = np.mean([
+            len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(exact.pop("_found"), approximate.pop("_found"))
+        ])
+        approximate[f"recall_at_{args.k}"] = round(float(recall), 4)
+        results[size] = {"numpy": exact, "chroma": approximate}
+
+        if crossover is None and approximate["query_p50_ms"] < exact["query_p50_ms"]:
+            crossover = size
+        if not args.json:
+            print(
+                f"{size:>8} chunks | numpy build {exact['build_s']:7.2f}s cold {exact['cold_query_ms']:7.1f} ms "
+                f"p50 {exact['query_p50_ms']:7.3f} ms | chroma build {approximate['build_s']:7.2f}s "
+                f"cold {approximate['cold_query_ms']:7.1f} ms p50 {approximate['query_p50_ms']:7.3f} ms "
+                f"recall {recall:.3f}",
+                flush=True
+            )
+
+    if args.json:
+        print(json.dumps({"dim": args.dim, "k": args.k, "crossover_chunks": crossover, "results": results}, indent=2))
+    elif crossover:
+        print(f"📍 Chroma queries get faster than exact NumPy search at ~{crossover} chunks")
+    else:
+        print("📍 NumPy was faster at every size tested")
+
+
+if __name__ == "__main__":
+    main()
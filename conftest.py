@@ -0,0 +1,143 @@
+"""
+Shared fixtures for the offline test suite (`python -m pytest -q`).
+
+Every test runs in its own temporary directory, because the services
+persist under ./db. Embeddings come from a deterministic bag-of-words
+hash backend, and LLM calls from benchmarks/fake_llm.py, so nothing
+needs a model download or network. When tiktoken cannot fetch its
+encodings, a whitespace tokenizer stands in for it.
+"""
+
+import hashlib
+import re
+
+import numpy as np
+import pytest
+import tiktoken
+
+from app.services.embeddings import EmbeddingBackend
+
+# Manual environment check for demos (imports every dependency), not a test module
+collect_ignore = ["test_setup.py"]
+
+DIM = 64
+
+
+class HashEmbeddings(EmbeddingBackend):
+    """Bag-of-words vectors: texts sharing words are close, identical texts identical."""
+
+    name = "hash"
+
+    def __init__(self, dim: int = DIM):
+        super().__init__(model_name=f"hash-{dim}")
+        self.dim = dim
+        self.calls = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        return vectors.tolist()
+
+
+class WhitespaceEncoding:
+    """Just enough of tiktoken's Encoding API: one token per word or whitespace run."""
+
+    def __init__(self):
+        self._ids = {}
+        self._pieces = []
+
+    def _id(self, piece: str) -> int:
+        if piece not in self._ids:
+            self._ids[piece] = len(self._pieces)
+            self._pieces.append(piece)
+        return self._ids[piece]
+
+    def encode(self, text: str, **_) -> list[int]:
+        return [self._id(piece) for piece in re.findall(r"\w+|[^\w\s]|\s+", text)]
+
+    encode_ordinary = encode
+
+    def encode_batch(self, texts: list[str], **_) -> list[list[int]]:
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens: list[int]) -> str:
+        return "".join(self._pieces[token] for token in tokens)
+
+    def decode_with_offsets(self, tokens: list[int]) -> tuple:
+        offsets, position = [], 0
+        for token in tokens:
+            offsets.append(position)
+            position += len(self._pieces[token])
+        return self.decode(tokens), offsets
+
+
+def _tiktoken_available() -> bool:
+    try:
+        tiktoken.get_encoding("o200k_base")
+        return True
+    except Exception:
+        return False
+
+
+@pytest.fixture(scope="session", autouse=True)
+def offline_tokenizer():
+    if _tiktoken_available():
+        yield
+        return
+
+    encoding = WhitespaceEncoding()
+    patch = pytest.MonkeyPatch()
+    patch.setattr(tiktoken, "encoding_for_model", lambda model: encoding)
+    patch.setattr(tiktoken, "get_encoding", lambda name: encoding)
+    yield
+    patch.undo()
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory, with tracing off."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("TOKEN_DIET_TRACE_FILE", "")
+    return tmp_path
+
+
+@pytest.fixture
+def embeddings():
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def make_pruner(embeddings):
+    """Builds SemanticPruner instances on the hash embeddings (NumPy index unless told otherwise)."""
+    from app.services.pruner import SemanticPruner
+
+    def make(**kwargs):
+        kwargs.setdefault("embeddings", embeddings)
+        kwargs.setdefault("vector_index", "numpy")
+        return SemanticPruner(**kwargs)
+
+    return make
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Every model in the shared LLM pool answers instantly from benchmarks/fake_llm.py."""
+    from app.services.llm_pool import llm_pool
+    from benchmarks.fake_llm import install_fake_llm
+
+    monkeypatch.setattr(llm_pool, "_clients", {})
+    install_fake_llm(ttft_ms=0, tokens_per_s=1e9)
+    return llm_pool
+
+
+@pytest.fixture
+def services(make_pruner, fake_llm, monkeypatch):
+    """Graph services built fresh in the test directory, on the hash embeddings and fake LLM."""
+    from app.agents import graph
+
+    monkeypatch.setattr(graph, "_services", {"pruner": make_pruner()})
+    return graph
@@ -0,0 +1,63 @@
+import hashlib
+import multiprocessing
+
+from app.services.chunk_store import ChunkStore
+
+
+def _chunks(names) -> dict:
+    texts = [f"Chunk {name}: " + "é payload " * (len(str(name)) + 3) for name in names]
+    return {hashlib.sha256(text.encode()).hexdigest()[:32]: text for text in texts}
+
+
+def test_text_is_written_once_per_hash():
+    store = ChunkStore("db/chunks")
+    chunks = _chunks(range(10))
+
+    refs = store.put_many(chunks)
+    size = store.size()
+    assert store.put_many(chunks) == refs
+    assert store.size() == size == sum(len(text.encode()) for text in chunks.values())
+
+    reopened = ChunkStore("db/chunks")
+    assert reopened.get_many(list(chunks)) == chunks
+    offset, length = refs[next(iter(chunks))]
+    assert reopened.read(offset, length) == next(iter(chunks.values()))
+
+
+def test_reader_sees_chunks_appended_by_another_instance():
+    reader = ChunkStore("db/chunks")
+    reader.put_many(_chunks(["a"]))
+    assert reader.get_many(list(_chunks(["a"])))
+
+    # The reader's mapping predates these bytes, so it has to remap
+    later = _chunks(["b", "c"])
+    ChunkStore("db/chunks").put_many(later)
+    assert reader.get_many(list(later)) == later
+
+
+def _put_from_process(path: str, names: list):
+    store = ChunkStore(path)
+    for start in range(0, len(names), 5):
+        store.put_many(_chunks(names[start:start + 5]))
+
+
+def test_concurrent_processes_append_without_clobbering(workdir):
+    path = str(workdir / "db" / "chunks")
+    ChunkStore(path)
+    # Every worker also writes the shared names, racing the others for them
+    shared = [f"shared-{i}" for i in range(20)]
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_put_from_process, args=(path, shared + [f"{worker}-{i}" for i in range(60)]))
+        for worker in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    expected = _chunks(shared + [f"{worker}-{i}" for worker in range(3) for i in range(60)])
+    store = ChunkStore(path)
+    assert store.get_many(list(expected)) == expected
+    assert store.size() == sum(len(text.encode()) for text in expected.values())
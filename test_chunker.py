@@ -0,0 +1,25 @@
+import pytest
+
+from app.services.chunker import CHUNKERS, Chunker, get_chunker
+
+TEXT = " ".join(f"Sentence number {i} covers a separate point of the report." for i in range(60))
+
+
+def test_chunkers_must_implement_split():
+    class Incomplete(Chunker):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("strategy", sorted(CHUNKERS))
+def test_streaming_matches_splitting_the_whole_text(strategy):
+    chunker = get_chunker(strategy)
+    pages = [TEXT[i:i + 450] for i in range(0, len(TEXT), 450)]
+
+    streamed = [chunk.text for chunk in chunker.stream(pages)]
+
+    assert streamed == [chunk.text for chunk in chunker.split(TEXT)]
+    for chunk in chunker.split(TEXT):
+        assert TEXT[chunk.char_start:chunk.char_end] == chunk.text
@@ -0,0 +1,66 @@
+from app.services.context_packer import ContextPacker
+from app.utils import count_tokens
+
+SENTENCES = [f"Sentence {i} talks about topic {i % 7} in some detail." for i in range(40)]
+
+
+def _hits(texts, doc_id="A"):
+    hits, position = [], 0
+    for rank, text in enumerate(texts):
+        hits.append({
+            "id": f"{doc_id}:{rank}",
+            "text": text,
+            "rank": rank,
+            "metadata": {"doc_id": doc_id, "position": rank, "char_start": position, "char_end": position + len(text)}
+        })
+        position += len(text) + 1
+    return hits
+
+
+def test_pack_never_exceeds_the_budget():
+    packer = ContextPacker(budgets={}, default_budget=100)
+    hits = _hits(SENTENCES)
+
+    for budget in (10, 37, 100, 250):
+        packed = packer.pack(hits, budget)
+        assert packed.tokens == count_tokens(packed.text) <= budget
+        assert len(packed.chunks) + packed.dropped == len(hits)
+
+
+def test_pack_drops_duplicates_and_keeps_document_order():
+    packer = ContextPacker(budgets={}, default_budget=100)
+    hits = _hits(SENTENCES[:4])
+    duplicate = {**hits[0], "id": "B:0", "rank": 9, "metadata": {"doc_id": "B", "position": 0}}
+    reordered = [hits[2], hits[0], duplicate, hits[1]]
+    for rank, hit in enumerate(reordered):
+        hit["rank"] = rank
+
+    packed = packer.pack(reordered, 1000)
+
+    assert [hit["id"] for hit in packed.chunks] == ["A:0", "A:1", "A:2"]
+    assert packed.text.startswith(SENTENCES[0]) and packed.dropped == 1
+
+
+def test_truncate_cuts_to_the_budget():
+    packer = ContextPacker(budgets={}, default_budget=100)
+    text = " ".join(SENTENCES)
+
+    truncated = packer.truncate(text, 50)
+
+    assert text.startswith(truncated.text)
+    assert 40 < truncated.tokens == count_tokens(truncated.text) <= 50
+    assert packer.truncate("short", 50).text == "short"
+
+
+def test_failed_retrieval_sends_the_original_cut_to_budget(make_pruner, monkeypatch):
+    pruner = make_pruner()
+    original = " ".join(SENTENCES * 3)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(pruner, "retrieve", fail)
+    context = pruner.get_relevant_context("topic 3", original, token_budget=60)
+
+    assert context and original.startswith(context)
+    assert count_tokens(context) <= 60
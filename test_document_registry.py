@@ -0,0 +1,34 @@
+import json
+import os
+
+from app.services.document_registry import DocumentRegistry
+
+
+def test_two_registries_merge_instead_of_overwriting():
+    first = DocumentRegistry("db/documents.sqlite")
+    second = DocumentRegistry("db/documents.sqlite")
+
+    first.register("t", "A", filename="a.txt")
+    second.register("t", "B", filename="b.txt")
+    first.register("t", "A", chunks=3)
+
+    fresh = DocumentRegistry("db/documents.sqlite")
+    documents = fresh.list_documents("t")
+    assert list(documents) == ["A", "B"]
+    assert documents["A"]["filename"] == "a.txt" and documents["A"]["chunks"] == 3
+    assert second.get("t", "A")["chunks"] == 3
+
+    second.unregister("t", "B")
+    assert list(first.list_documents("t")) == ["A"]
+
+
+def test_imports_old_json_registry():
+    os.makedirs("db")
+    with open("db/documents.json", "w", encoding="utf-8") as f:
+        json.dump({"t": {"A": {"filename": "a.txt"}}, "u": {"C": {}}}, f)
+
+    registry = DocumentRegistry("db/documents.sqlite")
+
+    assert registry.get("t", "A") == {"filename": "a.txt"}
+    assert registry.tenants() == ["t", "u"]
+    assert os.path.exists("db/documents.json.imported") and not os.path.exists("db/documents.json")
@@ -0,0 +1,16 @@
+import pytest
+
+from app.services.embeddings import EmbeddingBackend
+
+
+def test_backends_must_implement_embed_documents():
+    class Incomplete(EmbeddingBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_embed_query_defaults_to_one_document(embeddings):
+    assert embeddings.embed_query("Apollo budget") == embeddings.embed_documents(["Apollo budget"])[0]
+    assert embeddings.signature() == "hash(model=hash-64)"
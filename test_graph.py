@@ -0,0 +1,70 @@
+import pytest
+
+from app.agents.state import initial_state
+from app.services.context_packer import context_packer
+from app.utils import count_tokens
+from test_pruner import REPORT
+
+
+@pytest.fixture
+def failing_retrieval(services, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(services.get_pruner(), "retrieve", fail)
+    monkeypatch.setattr(context_packer, "budgets", {})
+    monkeypatch.setattr(context_packer, "default_budget", 60)
+    return services
+
+
+def test_failed_retrieval_sends_raw_context_cut_to_budget(failing_retrieval):
+    update = failing_retrieval.prune_node(initial_state("Who owns finding 3?", context=REPORT))
+
+    assert update["pruned_context"] and REPORT.startswith(update["pruned_context"])
+    assert update["context_tokens"] == count_tokens(update["pruned_context"]) <= 60
+
+
+def test_failed_retrieval_sends_start_of_ingested_document(failing_retrieval):
+    pruner = failing_retrieval.get_pruner()
+    pruner.ingest_document(REPORT, doc_id="audit")
+
+    state = initial_state("Who owns finding 3?", doc_ids=["audit"])
+    update = failing_retrieval.prune_node(state)
+    text = failing_retrieval.context_text({**state, **update})
+
+    assert text.startswith("Section 0")
+    assert 0 < update["context_tokens"] <= 60
+
+
+def test_failed_retrieval_packs_whole_chunks_when_they_fit(failing_retrieval, monkeypatch):
+    pruner = failing_retrieval.get_pruner()
+    pruner.ingest_document(REPORT, doc_id="audit")
+    monkeypatch.setattr(context_packer, "default_budget", 500)
+
+    update = failing_retrieval.prune_node(initial_state("Who owns finding 3?", doc_ids=["audit"]))
+
+    assert update["pruned_context"] is None
+    assert update["chunk_refs"][0]["position"] == 0
+    assert update["context_tokens"] <= 500
+
+
+def test_graph_answers_from_fallback_context(failing_retrieval):
+    final = failing_retrieval.build_agent_graph().invoke(initial_state("Who owns finding 3?", context=REPORT))
+
+    assert "Section 0" in final["response"]
+
+
+def test_raw_contexts_do_not_share_cached_answers(services):
+    from test_pruner import DOC_A, DOC_B
+
+    # Any ingested document gives the tenant a corpus fingerprint
+    services.get_pruner().ingest_document(REPORT, doc_id="audit")
+    graph = services.build_agent_graph()
+
+    first = graph.invoke(initial_state("What does the text say?", context=DOC_A))
+    second = graph.invoke(initial_state("What does the text say?", context=DOC_B))
+    again = graph.invoke(initial_state("What does the text say?", context=DOC_A))
+
+    assert "Apollo" in first["response"]
+    assert not second["cache_hit"] and "Refunds" in second["response"]
+    assert again["cache_hit"] and again["response"] == first["response"]
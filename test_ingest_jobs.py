@@ -0,0 +1,35 @@
+from app.services import ingest_jobs as jobs_module
+from app.services.ingest_jobs import IngestJobs
+from test_pruner import DOC_A, DOC_B, REPORT
+
+
+def _finished(job):
+    assert job.wait(timeout=30) and job.status == "done", job.error
+    return job
+
+
+def test_same_file_from_two_sessions_is_indexed_once(make_pruner):
+    pruner = make_pruner()
+    jobs = IngestJobs(lambda: pruner)
+
+    first = _finished(jobs.submit("ui", "report.txt", REPORT.encode(), "text/plain"))
+    renamed = jobs.submit("ui", "copy of report.txt", REPORT.encode(), "text/plain")
+    other = _finished(jobs.submit("ui", "report.txt", DOC_A.encode(), "text/plain"))
+
+    assert renamed is first
+    assert other.doc_id != first.doc_id
+    assert set(pruner.list_documents("ui")) == {first.doc_id, other.doc_id}
+    assert pruner.list_documents("ui")[first.doc_id]["name"] == "report.txt"
+
+
+def test_file_indexed_by_an_earlier_process_is_not_extracted_again(make_pruner, monkeypatch):
+    _finished(IngestJobs(make_pruner).submit("ui", "b.txt", DOC_B.encode(), "text/plain"))
+
+    def extract(upload):
+        raise AssertionError("extracted again")
+
+    monkeypatch.setattr(jobs_module, "iter_pages_from_file", extract)
+    job = _finished(IngestJobs(make_pruner).submit("ui", "b.txt", DOC_B.encode(), "text/plain"))
+
+    assert job.result["stats"]["added"] == 0
+    assert job.result["document"]["tokens"] > 0
@@ -0,0 +1,50 @@
+from app.services.judge import ResponseJudge
+
+CONTEXT = (
+    "Project Apollo was approved by the steering board in March. "
+    "The Apollo budget covers two launch windows and a backup crew."
+)
+
+
+def _judge(embeddings, **kwargs):
+    return ResponseJudge(embed_fn=embeddings.embed_query, **kwargs)
+
+
+def test_empty_and_refusals_are_rejected_locally(fake_llm, embeddings):
+    judge = _judge(embeddings)
+
+    assert judge.evaluate("Who approved Apollo?", "  ", CONTEXT).tier == "heuristic"
+    verdict = judge.evaluate("Who approved Apollo?", "Information not available.", CONTEXT)
+    assert (verdict.score, verdict.tier) == (2, "heuristic")
+
+
+def test_ungrounded_answer_is_rejected_locally(fake_llm, embeddings):
+    judge = _judge(embeddings)
+    vectors = embeddings.embed_documents(CONTEXT.split(". "))
+
+    verdict = judge.evaluate(
+        "Who approved Apollo?",
+        "Refunds are issued within fourteen days, shipping remains free above fifty euros.",
+        CONTEXT,
+        context_vectors=vectors
+    )
+    assert (verdict.score, verdict.tier) == (3, "heuristic")
+
+
+def test_grounded_but_off_topic_answer_goes_to_the_llm(fake_llm, embeddings):
+    # Copies the context, so the old lexical check accepted it without asking the model
+    judge = _judge(embeddings)
+    answer = "The Apollo budget covers two launch windows and a backup crew."
+
+    first = judge.evaluate("How long do refunds take for returned orders?", answer, CONTEXT)
+    second = judge.evaluate("How long do refunds take for returned orders?", answer, CONTEXT)
+
+    assert first.tier == "llm" and first.call is not None
+    assert (second.tier, second.score) == ("cache", first.score)
+
+
+def test_heuristic_verdicts_are_not_cached(fake_llm, embeddings):
+    judge = _judge(embeddings)
+    judge.evaluate("Who approved Apollo?", "I don't know.", CONTEXT)
+
+    assert judge._cached("Who approved Apollo?", "I don't know.") is None
@@ -0,0 +1,58 @@
+from app.services.keyword_index import KeywordIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_rrf_rewards_items_ranked_by_both_lists():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]]) == ["c", "a", "b", "d"]
+    assert reciprocal_rank_fusion([["a"], []]) == ["a"]
+
+
+def test_identifiers_are_indexed_whole_and_in_parts():
+    assert tokenize("See ERR-404 in clause 7.2.1") == ["see", "err-404", "err", "404", "clause", "7.2.1", "7", "2", "1"]
+
+
+def test_bm25_search_filters_by_document_and_forgets_removed_chunks():
+    index = KeywordIndex("db/keyword_index.sqlite")
+    index.add("t", [
+        ("A:1", "A", "Error ERR-404 means the page is missing."),
+        ("A:2", "A", "Error ERR-500 means the server failed."),
+        ("B:1", "B", "ERR-404 also appears in the proxy logs.")
+    ])
+
+    assert [record_id for record_id, _ in index.search("ERR-404", tenant_id="t")][:2] in (["A:1", "B:1"], ["B:1", "A:1"])
+    # "err" alone still matches ERR-500, but below the exact identifier
+    assert [record_id for record_id, _ in index.search("ERR-404", tenant_id="t", doc_ids="A")] == ["A:1", "A:2"]
+
+    index.remove_document("t", "A")
+    assert [record_id for record_id, _ in index.search("ERR-404", tenant_id="t")] == ["B:1"]
+    assert not index.has_document("t", "A")
+
+
+def test_hybrid_retrieval_surfaces_an_exact_identifier(make_pruner):
+    pruner = make_pruner()
+    for i in range(12):
+        pruner.ingest_document(
+            f"Which product is SKU-1000{i} in the warehouse? It is product line {i}.",
+            doc_id=f"note-{i}"
+        )
+    pruner.ingest_document("Catalog entry SKU-88412 is a walnut desk.", doc_id="catalog")
+    query = "Which product is SKU-88412 in the warehouse?"
+
+    vector_only = make_pruner(hybrid=False).retrieve(query, k=3)
+    hybrid = pruner.retrieve(query, k=3)
+
+    assert all(hit["metadata"]["doc_id"] != "catalog" for hit in vector_only)
+    assert any("SKU-88412" in hit["text"] for hit in hybrid)
+
+
+def test_corpus_stats_follow_writes_from_another_connection():
+    reader = KeywordIndex("db/keyword_index.sqlite")
+    writer = KeywordIndex("db/keyword_index.sqlite")
+    writer.add("t", [("A:1", "A", "Error ERR-404 means the page is missing.")])
+    assert reader._stats("t")[0] == 1
+
+    writer.add("t", [("B:1", "B", "Shipping is free above fifty euros, said the notice.")])
+    assert reader._stats("t") == writer._stats("t")
+    assert reader._stats("t")[0] == 2
+
+    writer.remove_document("t", "A")
+    assert reader._stats("t")[0] == 1
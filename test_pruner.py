@@ -0,0 +1,101 @@
+DOC_A = (
+    "Project Apollo was approved by the steering board in March. "
+    "The Apollo budget covers two launch windows and a backup crew."
+)
+DOC_B = (
+    "Refunds are issued within fourteen days of a returned order. "
+    "Shipping is free for orders above fifty euros."
+)
+
+
+def test_two_pruners_sharing_a_tenant_keep_both_documents(make_pruner):
+    make_pruner().ingest_document(DOC_A, doc_id="A", tenant_id="z")
+    make_pruner().ingest_document(DOC_B, doc_id="B", tenant_id="z")
+
+    fresh = make_pruner()
+    hits = fresh.retrieve("Who approved project Apollo?", k=3, tenant_id="z", doc_ids="A")
+    assert hits and all(hit["metadata"]["doc_id"] == "A" for hit in hits)
+    assert "Apollo" in hits[0]["text"]
+    assert fresh.retrieve("refund window", k=3, tenant_id="z", doc_ids="B")
+
+
+REPORT = " ".join(f"Section {i} of the audit lists finding number {i} and its owner." for i in range(80))
+
+
+def _recording(embeddings, monkeypatch) -> list:
+    embedded = []
+    original = embeddings.embed_documents
+
+    def embed_documents(texts):
+        embedded.extend(texts)
+        return original(texts)
+
+    monkeypatch.setattr(embeddings, "embed_documents", embed_documents)
+    return embedded
+
+
+def test_unchanged_document_is_not_embedded_again(make_pruner, embeddings, monkeypatch):
+    pruner = make_pruner()
+    first = pruner.ingest_document(REPORT, doc_id="audit")
+    embedded = _recording(embeddings, monkeypatch)
+
+    again = make_pruner().ingest_document(REPORT, doc_id="audit")
+
+    assert first["added"] == first["chunks"] > 2
+    assert (again["added"], again["unchanged"]) == (0, first["chunks"])
+    assert embedded == []
+
+
+def test_revision_only_embeds_changed_chunks(make_pruner, embeddings, monkeypatch):
+    pruner = make_pruner()
+    first = pruner.ingest_document(REPORT, doc_id="audit")
+    embedded = _recording(embeddings, monkeypatch)
+
+    revised = REPORT + " An appendix was added after the review closed."
+    stats = pruner.ingest_document(revised, doc_id="audit")
+
+    assert 1 <= stats["added"] < first["chunks"]
+    assert stats["unchanged"] == first["chunks"] - stats["deleted"]
+    assert len(embedded) == stats["added"] and "appendix" in embedded[-1]
+    assert pruner.get_collection("default").count() == stats["chunks"]
+
+
+def test_identical_text_in_another_document_reuses_vectors_and_text(make_pruner, embeddings, monkeypatch):
+    pruner = make_pruner()
+    pruner.ingest_document(REPORT, doc_id="audit")
+    stored = pruner.chunk_store.size()
+    embedded = _recording(embeddings, monkeypatch)
+
+    copy = pruner.ingest_document(REPORT, doc_id="audit-copy")
+
+    assert copy["added"] == copy["chunks"]
+    assert embedded == []
+    assert pruner.chunk_store.size() == stored
+    assert set(pruner.list_documents()) == {"audit", "audit-copy"}
+
+
+def test_chunk_vectors_follow_ref_order(make_pruner, embeddings):
+    import numpy as np
+
+    pruner = make_pruner()
+    pruner.ingest_document(REPORT, doc_id="audit")
+    hits = pruner.retrieve("Who owns finding 3?", k=5)[::-1]
+    refs = hits[:1] + [{"id": "missing"}] + hits[1:] + hits[:1]
+
+    vectors = pruner.chunk_vectors(refs)
+
+    expected = embeddings.embed_documents([hit["text"] for hit in hits + hits[:1]])
+    np.testing.assert_allclose(vectors, expected, atol=1e-5)
+
+
+def test_mmr_leaves_the_callers_arrays_alone():
+    import numpy as np
+
+    from app.services.pruner import maximal_marginal_relevance
+
+    query = np.array([3.0, 4.0], dtype=np.float32)
+    vectors = np.array([[2.0, 0.0], [0.0, 5.0]], dtype=np.float32)
+
+    assert maximal_marginal_relevance(query, vectors, k=1) == [1]
+    assert query.tolist() == [3.0, 4.0]
+    assert vectors.tolist() == [[2.0, 0.0], [0.0, 5.0]]
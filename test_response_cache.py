@@ -0,0 +1,21 @@
+from app.services.response_cache import ResponseCache
+
+
+def test_semantic_lookup_skips_embeddings_of_another_size():
+    cache = ResponseCache(path="db/response_cache.sqlite")
+    cache.put("doc", "Who approved Apollo?", "m", "The board.", quality_score=8, query_embedding=[1.0, 0.0, 0.0])
+    cache.put("doc", "Who signed off Apollo?", "m", "The board, in March.", quality_score=8, query_embedding=[0.0, 1.0])
+
+    hit = cache.get("doc", "Which board approved Apollo?", "m", query_embedding=[0.0, 1.0])
+
+    assert hit is not None and hit[0]["response"] == "The board, in March."
+    assert cache.get("doc", "Anything else?", "m", query_embedding=[0.5] * 8) is None
+
+
+def test_exact_hits_are_scoped_by_fingerprint_and_model():
+    cache = ResponseCache(path="db/response_cache.sqlite")
+    cache.put("doc", "Who approved Apollo?", "m", "The board.", quality_score=8)
+
+    assert cache.get("doc", "who approved  apollo?", "m")[0]["response"] == "The board."
+    assert cache.get("other", "Who approved Apollo?", "m") is None
+    assert cache.get("doc", "Who approved Apollo?", "other-model") is None
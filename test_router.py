@@ -0,0 +1,69 @@
+import threading
+
+import numpy as np
+
+from app.agents.state import initial_state
+from app.services.judge import JudgeVerdict
+from app.services.model_registry import model_registry
+from app.services.router import ModelRouter, RoutingOutcomes
+
+CHEAPEST = model_registry.models()[0].name
+
+
+def _router(**kwargs):
+    return ModelRouter(outcomes=RoutingOutcomes("./db/outcomes.sqlite"), min_samples=2, **kwargs)
+
+
+def _record(router, embeddings):
+    for query in ["What is the refund window?", "When was Apollo approved?", "Who owns the budget?"]:
+        router.record_outcome(embeddings.embed_query(query), CHEAPEST, 9)
+    for query in ["Compare both audits and reconcile every finding", "Derive the failure rate per region"]:
+        router.record_outcome(embeddings.embed_query(query), CHEAPEST, 3)
+
+
+def test_incremental_centroids_match_a_full_refit(embeddings):
+    router = _router(retrain_every=1000)
+    _record(router, embeddings)
+    incremental = router._centroids
+
+    assert incremental is not None
+    router.train()
+    np.testing.assert_allclose(incremental, router._centroids, atol=1e-5)
+
+
+def test_refit_runs_off_the_callers_thread(embeddings, monkeypatch):
+    router = _router(retrain_every=2)
+    started, release = threading.Event(), threading.Event()
+    refits = []
+    scan = router.outcomes.training_set
+
+    def slow_training_set(*args, **kwargs):
+        refits.append(threading.current_thread())
+        started.set()
+        release.wait(5)
+        return scan(*args, **kwargs)
+
+    monkeypatch.setattr(router.outcomes, "training_set", slow_training_set)
+    # Would block for 5 seconds if the refit ran here
+    _record(router, embeddings)
+    release.set()
+
+    assert started.wait(5)
+    assert threading.current_thread() not in refits
+
+
+def test_heuristic_verdicts_are_not_router_training_data(services, monkeypatch):
+    router = _router()
+    monkeypatch.setitem(services._services, "router", router)
+    state = {
+        **initial_state("Who owns finding 3?", context="Finding 3 is owned by Dana."),
+        "document_fingerprint": "doc",
+        "chosen_model": CHEAPEST,
+        "response": "Information not available."
+    }
+
+    services._judge_update(state, JudgeVerdict(2, "heuristic", "refusal"))
+    assert len(router.outcomes) == 0
+
+    services._judge_update(state, JudgeVerdict(8, "llm"))
+    assert len(router.outcomes) == 1
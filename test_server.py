@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api import server
+from test_pruner import DOC_A, DOC_B
+
+
+@pytest.fixture
+def client(services):
+    services.get_pruner().ingest_document(DOC_A, doc_id="A")
+    with TestClient(server.app) as client:
+        yield client
+
+
+def _events(response) -> list[dict]:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_stream_releases_its_admission_slot(client):
+    response = client.post("/query/stream", json={"prompt": "Who approved project Apollo?", "doc_ids": ["A"]})
+
+    events = _events(response)
+    assert events[-1]["type"] == "final" and "Apollo" in events[-1]["response"]
+    assert any(event["type"] == "token" for event in events)
+    assert client.get("/metrics").json()["server"]["in_flight"] == 0
+
+
+def test_stream_deadline_covers_a_stalled_graph(client, monkeypatch):
+    async def stalled(agent, state):
+        yield "node", "prune"
+        await asyncio.sleep(30)
+        yield "final", {}
+
+    monkeypatch.setattr(server, "astream_agent", stalled)
+    monkeypatch.setattr(server, "REQUEST_TIMEOUT", 0.2)
+
+    started = time.perf_counter()
+    events = _events(client.post("/query/stream", json={"prompt": "Who approved project Apollo?"}))
+
+    assert time.perf_counter() - started < 5
+    assert events == [{"type": "node", "name": "prune"}, {"type": "error", "detail": "Request timed out"}]
+    stats = client.get("/metrics").json()["server"]
+    assert (stats["timeouts"], stats["in_flight"]) == (1, 0)
+
+
+def test_admission_rejects_past_the_queue_limit():
+    async def scenario():
+        admission = server.AdmissionControl(max_in_flight=1, max_queued=1, metrics=server.Metrics())
+        async with admission:
+            waiter = asyncio.create_task(admission.__aenter__())
+            await asyncio.sleep(0)
+            assert admission.queued == 1
+            with pytest.raises(HTTPException) as rejected:
+                await admission.__aenter__()
+            assert rejected.value.status_code == 503
+        await waiter
+        await admission.__aexit__(None, None, None)
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert (admission.in_flight, admission.metrics.rejected) == (0, 1)
+
+
+def test_batched_prefetch_is_found_whatever_the_doc_id_order(services):
+    pruner = services.get_pruner()
+    pruner.ingest_document(DOC_A, doc_id="A")
+    pruner.ingest_document(DOC_B, doc_id="B")
+    batcher = server.QueryBatcher(pruner, k=4, max_size=8, max_wait_ms=1, metrics=server.Metrics())
+
+    async def submit():
+        batcher.start()
+        await batcher.submit("Who approved project Apollo?", "default", ["B", "A"])
+        await batcher.stop()
+
+    asyncio.run(submit())
+    assert pruner._take_prefetched("default", ["B", "A"], "Who approved project Apollo?", 4) is not None
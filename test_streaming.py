@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.messages import AIMessageChunk
+
+from app.agents.streaming import stream_agent
+
+
+class EndlessAgent:
+    """Streams executor tokens until its event stream is closed."""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    async def astream_events(self, state, version):
+        try:
+            yield {"event": "on_chain_start", "name": "LangGraph", "run_id": "root", "metadata": {}}
+            while True:
+                yield {
+                    "event": "on_chat_model_stream",
+                    "name": "fake",
+                    "run_id": "llm",
+                    "metadata": {"langgraph_node": "execute"},
+                    "data": {"chunk": AIMessageChunk(content="token ")}
+                }
+                await asyncio.sleep(0)
+        finally:
+            self.closed.set()
+
+
+def _pump_alive() -> bool:
+    return any(thread.name == "stream_agent" and thread.is_alive() for thread in threading.enumerate())
+
+
+def test_closing_the_stream_early_stops_the_graph_thread():
+    agent = EndlessAgent()
+    stream = stream_agent(agent, {"prompt": "q"})
+    assert [next(stream) for _ in range(3)] == [("token", "token ")] * 3
+
+    # Let the pump fill the queue and block on it before the consumer goes away
+    time.sleep(0.3)
+    stream.close()
+
+    assert agent.closed.wait(timeout=5)
+    deadline = time.monotonic() + 5
+    while _pump_alive() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _pump_alive()
+
+
+def test_stream_ends_with_the_final_state(services):
+    from app.agents.state import initial_state
+    from test_pruner import DOC_A
+
+    services.get_pruner().ingest_document(DOC_A, doc_id="A")
+    events = list(stream_agent(services.build_agent_graph(), initial_state("Who approved project Apollo?", doc_ids=["A"])))
+
+    kind, final = events[-1]
+    assert kind == "final" and "Apollo" in final["response"]
+    assert ("node", "judge") in events
+    assert not _pump_alive()
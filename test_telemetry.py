@@ -0,0 +1,36 @@
+import json
+
+from app.services.telemetry import Telemetry, state_size
+
+
+def test_state_size_tracks_the_json_size():
+    state = {
+        "prompt": "Who approved project Apollo?",
+        "pruned_context": "Project Apollo was approved by the steering board. " * 2000,
+        "chunk_refs": [{"id": f"A:{i:032x}", "offset": i * 339, "length": 339, "doc_id": "A"} for i in range(12)],
+        "quality_score": 8,
+        "cache_hit": None,
+        "total_cost": 0.0005307,
+        "trace": [{"node": "prune", "wall_ms": 3.998, "chunks": 6}] * 5
+    }
+
+    exact = len(json.dumps(state))
+    assert abs(state_size(state) - exact) / exact < 0.02
+
+
+def test_spans_reach_the_trace_file_from_the_writer_thread(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    telemetry = Telemetry(trace_path=str(path))
+
+    @telemetry.instrument("prune")
+    def prune(state):
+        return {"retrieval_k": 6}
+
+    for iteration in range(3):
+        update = prune({"iteration_count": iteration, "trace_id": "t"})
+    telemetry.flush()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [span["attributes"]["iteration"] for span in spans] == [0, 1, 2]
+    assert update["trace"][-1]["state_bytes"] == state_size({"iteration_count": 2, "trace_id": "t"})
+    assert 'token_diet_node_duration_seconds_count{node="prune"} 3' in telemetry.prometheus()
@@ -0,0 +1,105 @@
+import multiprocessing
+
+import numpy as np
+
+from app.services.vector_index import NumpyCollection
+
+
+def _vectors(n: int, seed: int = 0, dim: int = 16) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def _add(collection, start: int, vectors: np.ndarray, doc_id: str):
+    collection.add(
+        ids=[f"{doc_id}:{i}" for i in range(start, start + len(vectors))],
+        embeddings=vectors.tolist(),
+        metadatas=[{"doc_id": doc_id, "position": i} for i in range(start, start + len(vectors))]
+    )
+
+
+def test_query_matches_brute_force_with_filters():
+    collection = NumpyCollection("db/vectors/test")
+    vectors = _vectors(50)
+    _add(collection, 0, vectors[:30], "a")
+    _add(collection, 30, vectors[30:], "b")
+    query = _vectors(1, seed=1)[0]
+
+    result = collection.query(query_embeddings=[query.tolist()], n_results=5, where={"doc_id": "a"})
+
+    distances = ((vectors[:30] - query) ** 2).sum(axis=1)
+    expected = [f"a:{i}" for i in np.argsort(distances)[:5]]
+    assert result["ids"][0] == expected
+    assert np.allclose(result["distances"][0], np.sort(distances)[:5], atol=1e-4)
+
+
+def test_upsert_replaces_and_delete_hides_rows():
+    collection = NumpyCollection("db/vectors/test")
+    vectors = _vectors(4)
+    _add(collection, 0, vectors, "a")
+
+    collection.upsert(ids=["a:0"], embeddings=[vectors[3].tolist()], metadatas=[{"doc_id": "a", "position": 9}])
+    collection.delete(ids=["a:3"])
+
+    assert collection.count() == 3
+    assert collection.get(ids=["a:0"])["metadatas"] == [{"doc_id": "a", "position": 9}]
+    hit = collection.query(query_embeddings=[vectors[3].tolist()], n_results=1)
+    assert hit["ids"][0] == ["a:0"]
+
+
+def test_compact_keeps_live_rows():
+    collection = NumpyCollection("db/vectors/test")
+    vectors = _vectors(20)
+    _add(collection, 0, vectors, "a")
+    collection.delete(ids=[f"a:{i}" for i in range(0, 20, 2)])
+    collection.compact()
+
+    reopened = NumpyCollection("db/vectors/test")
+    assert reopened.count() == 10
+    hit = reopened.query(query_embeddings=[vectors[5].tolist()], n_results=1)
+    assert hit["ids"][0] == ["a:5"]
+
+
+def test_two_writers_on_one_path_keep_each_others_rows():
+    first = NumpyCollection("db/vectors/shared")
+    second = NumpyCollection("db/vectors/shared")
+    vectors = _vectors(40)
+
+    # Interleaved appends: each writer must see the other's rows before writing its own
+    for start in range(0, 40, 10):
+        _add(first if start % 20 == 0 else second, start, vectors[start:start + 10], "a" if start % 20 == 0 else "b")
+
+    fresh = NumpyCollection("db/vectors/shared")
+    assert fresh.count() == 40
+    for i in (0, 15, 25, 39):
+        hit = fresh.query(query_embeddings=[vectors[i].tolist()], n_results=1)
+        assert hit["ids"][0][0].endswith(f":{i}")
+
+
+def _write_from_process(path: str, doc_id: str, seed: int):
+    collection = NumpyCollection(path)
+    vectors = _vectors(200, seed=seed)
+    for start in range(0, 200, 10):
+        _add(collection, start, vectors[start:start + 10], doc_id)
+
+
+def test_concurrent_processes_do_not_clobber_rows(workdir):
+    path = str(workdir / "db" / "vectors" / "shared")
+    NumpyCollection(path)
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_write_from_process, args=(path, doc_id, seed))
+        for seed, doc_id in enumerate(("a", "b", "c"))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    fresh = NumpyCollection(path)
+    assert fresh.count() == 600
+    for seed, doc_id in enumerate(("a", "b", "c")):
+        vectors = _vectors(200, seed=seed)
+        hit = fresh.query(query_embeddings=[vectors[123].tolist()], n_results=1, where={"doc_id": doc_id})
+        assert hit["ids"][0] == [f"{doc_id}:123"]
+        assert hit["distances"][0][0] < 1e-4
@@ -7,9 +7,16 @@ import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
 from app.agents.graph import build_agent_graph, get_pruner
-from app.utils.file_loader import extract_text_from_file
+from app.agents.state import initial_state as new_state
+from app.agents.streaming import stream_agent
+from app.services.cost_tracker import cost_tracker
+from app.services.ingest_jobs import IngestJobs
+from app.services.model_registry import model_registry
 from app.utils import count_tokens
 
+# Every session's uploads share one tenant; each document is addressed by its content
+UI_TENANT = "ui"
+
 # -------------------------
 # Page Config
 # -------------------------
@@ -92,6 +99,24 @@ def load_agent():
 
 agent = load_agent()
 
+
+@st.cache_resource
+def load_ingest_jobs():
+    # Shared across reruns and sessions: each upload is extracted and indexed once
+    return IngestJobs(get_pruner)
+
+ingest_jobs = load_ingest_jobs()
+
+
+def wait_for_ingest(job, placeholder):
+    """Shows a progress bar until the background ingestion finishes."""
+    if not job.done():
+        bar = placeholder.progress(job.progress, text="Indexing document...")
+        while not job.wait(timeout=0.2):
+            bar.progress(job.progress, text=f"Indexing document... {job.pages_done}/{job.total_pages} pages")
+    placeholder.empty()
+    return job
+
 # -------------------------
 # Main UI Layout
 # -------------------------
@@ -105,6 +130,22 @@ with col_left:
         help="The agent will extract text and index it for semantic search"
     )
 
+    # Indexing starts in the background as soon as a file is uploaded. Uploads are
+    # stored by content under one tenant, so the same file is never extracted or
+    # indexed twice, in this session or any other, and questions only search it
+    ingest_job = None
+    if uploaded_file:
+        ingest_job = ingest_jobs.submit(
+            UI_TENANT,
+            uploaded_file.name,
+            uploaded_file.getvalue(),
+            uploaded_file.type
+        )
+        if ingest_job.done() and ingest_job.status == "done":
+            st.caption(f"✅ Indexed ({ingest_job.result['tokens']:,} tokens in {ingest_job.seconds:.1f}s)")
+        elif not ingest_job.done():
+            st.caption(f"⏳ Indexing in the background... {ingest_job.pages_done}/{ingest_job.total_pages} pages")
+
 with col_right:
     st.subheader("❓ Ask a Question")
     prompt = st.text_area(
@@ -117,7 +158,11 @@ with col_right:
     # Live token counter
     if prompt:
         prompt_tokens = count_tokens(prompt)
-        st.caption(f"📊 Query tokens: {prompt_tokens} | Estimated cost: ${prompt_tokens * 2.50 / 1_000_000:.6f}")
+        # Input price of the baseline model, from config/models.json
+        st.caption(
+            f"📊 Query tokens: {prompt_tokens} | Estimated cost "
+            f"({model_registry.baseline().name}): ${cost_tracker.baseline_cost(prompt_tokens, output_tokens=0):.6f}"
+        )
 
 st.divider()
 
@@ -131,45 +176,66 @@ if st.button("🚀 Run Token-Diet Agent", type="primary", use_container_width=Tr
         # Step 1: Document Processing
         st.subheader("📄 Step 1: Processing Document")
         
-        with st.spinner("Extracting text from uploaded file..."):
-            context = extract_text_from_file(uploaded_file)
-            doc_tokens = count_tokens(context)
-        
-        st.success(f"✅ Extracted **{len(context):,}** characters (**{doc_tokens:,}** tokens)")
-        
-        with st.spinner("Building vector index for semantic search..."):
-            pruner = get_pruner()  # Use the same pruner instance as the graph
-            pruner.ingest_document(context)
+        job = wait_for_ingest(ingest_job, st.empty())
+        if job.status == "failed":
+            st.error(f"❌ Could not index the document: {job.error}")
+            st.stop()
+
+        doc_tokens = job.result["tokens"]
+
+        st.success(f"✅ Extracted **{job.result['characters']:,}** characters (**{doc_tokens:,}** tokens)")
         
-        st.success("✅ Document indexed in ChromaDB")
+        st.success(f"✅ Document indexed for semantic search in {job.seconds:.1f}s (reused for every question on this file)")
         
         st.divider()
         
         # Step 2: Agent Execution
         st.subheader("🤖 Step 2: Running Agent Pipeline")
         
-        initial_state = {
-            "prompt": prompt,
-            "context": context,
-            "response": "",
-            "quality_score": 0,
-            "chosen_model": "",
-            "original_token_count": 0,
-            "final_token_count": 0,
-            "money_saved": 0.0,
-            "iteration_count": 0
-        }
+        # Only the document handle goes into the graph; chunk text is read from the store when needed
+        initial_state = new_state(
+            prompt,
+            tenant_id=UI_TENANT,
+            doc_ids=[job.doc_id],
+            document=job.result["document"]
+        )
         
-        # Run the agent
-        with st.spinner("⚙️ Agent is processing your query..."):
-            final_state = agent.invoke(initial_state)
+        # Run the agent, rendering executor tokens as they arrive
+        node_labels = {
+            "prune": "✂️ Pruning context...",
+            "compress": "🗜️ Compressing context...",
+            "route": "📡 Routing query...",
+            "execute": "🤖 Generating answer...",
+            "judge": "🧪 Judging answer..."
+        }
+        status_box = st.empty()
+        live_response = st.empty()
+        streamed = ""
+        final_state = None
+
+        for kind, payload in stream_agent(agent, initial_state):
+            if kind == "node":
+                status_box.caption(node_labels.get(payload, payload))
+                if payload == "execute":
+                    streamed = ""  # A retry starts a fresh answer
+            elif kind == "token":
+                streamed += payload
+                live_response.markdown(streamed + "▌")
+            elif kind == "final":
+                final_state = payload
+
+        status_box.empty()
+        live_response.empty()
         
         # Display all results AFTER completion (so they stay visible)
         st.success(f"✅ **Prune Node**: Reduced from **{final_state['original_token_count']:,}** to **{final_state['final_token_count']:,}** tokens (**{round((1 - final_state['final_token_count'] / final_state['original_token_count']) * 100, 1) if final_state['original_token_count'] > 0 else 0}%** reduction)")
         
         st.success(f"✅ **Route Node**: Selected **{final_state['chosen_model']}** based on query complexity")
         
-        st.success(f"✅ **Execute Node**: Generated response using **{final_state['chosen_model']}**")
+        if final_state.get("cache_hit"):
+            st.success(f"⚡ **Execute Node**: Served from response cache (**{final_state['cache_hit']}** match), no LLM call")
+        else:
+            st.success(f"✅ **Execute Node**: Generated response using **{final_state['chosen_model']}**")
         
         quality_emoji = "🌟" if final_state['quality_score'] >= 8 else "✅" if final_state['quality_score'] >= 7 else "⚠️"
         quality_text = "Excellent!" if final_state['quality_score'] >= 8 else "Good" if final_state['quality_score'] >= 7 else "Needs improvement"
@@ -184,39 +250,79 @@ if st.button("🚀 Run Token-Diet Agent", type="primary", use_container_width=Tr
         # -------------------------
         with st.expander("🔍 Detailed Agent Reasoning Breakdown", expanded=True):
             st.markdown("### How the Agent Optimized This Query")
-            
+
+            # Measured per-node spans, summed over iterations (see app.services.telemetry)
+            trace = final_state.get("trace") or []
+            timings = {}
+            for span in trace:
+                totals = timings.setdefault(span["node"], {"wall_ms": 0.0, "embed_ms": 0.0, "chroma_ms": 0.0, "runs": 0})
+                totals["runs"] += 1
+                for key in ("wall_ms", "embed_ms", "chroma_ms"):
+                    totals[key] += span.get(key, 0.0)
+
+            def timing_line(node):
+                totals = timings.get(node)
+                if not totals:
+                    return "n/a"
+                parts = [f"{totals['wall_ms']:.0f} ms wall"]
+                if totals["embed_ms"]:
+                    parts.append(f"{totals['embed_ms']:.0f} ms embedding")
+                if totals["chroma_ms"]:
+                    parts.append(f"{totals['chroma_ms']:.0f} ms vector search")
+                runs = f" over {totals['runs']} runs" if totals["runs"] > 1 else ""
+                return ", ".join(parts) + runs
+
             col_a, col_b = st.columns(2)
-            
+
             with col_a:
                 st.markdown("#### 🔹 Prune Node")
                 st.write(f"**Original Context**: {final_state['original_token_count']:,} tokens")
                 st.write(f"**After Pruning**: {final_state['final_token_count']:,} tokens")
                 st.write(f"**Reduction**: {final_state['original_token_count'] - final_state['final_token_count']:,} tokens removed")
-                st.write(f"**Method**: Semantic similarity search using ChromaDB")
-                
+                st.write(f"**Time**: {timing_line('prune')}")
+                if "compress" in timings:
+                    st.write(f"**Compression**: {final_state.get('compression_ratio', 1.0):.0%} of packed tokens kept ({timing_line('compress')})")
+
                 st.markdown("#### 🔹 Execute Node")
                 st.write(f"**LLM Used**: {final_state['chosen_model']}")
                 st.write(f"**Tokens Sent**: {final_state['final_token_count']:,}")
-                st.write(f"**Response Generated**: ✅ Success")
-            
+                st.write(f"**Cost**: ${(final_state.get('cost_by_node') or {}).get('execute', 0.0):.6f}")
+                st.write(f"**Time**: {timing_line('execute')}")
+
             with col_b:
                 st.markdown("#### 🔹 Route Node")
                 st.write(f"**Selected Model**: {final_state['chosen_model']}")
-                
-                # Explain why this model was chosen
-                if "70b" in final_state['chosen_model'].lower():
-                    st.write(f"**Reason**: Simple query detected")
-                    st.write(f"**Strategy**: Use cost-efficient model")
-                else:
-                    st.write(f"**Reason**: Complex query detected")
-                    st.write(f"**Strategy**: Use high-reasoning model")
-                
+                st.write(f"**Reason**: {final_state.get('routing_reason') or 'n/a'}")
+                st.write(f"**Time**: {timing_line('route')}")
+
                 st.markdown("#### 🔹 Judge Node")
                 st.write(f"**Quality Score**: {final_state['quality_score']}/10")
-                st.write(f"**Evaluation**: {'✅ Excellent' if final_state['quality_score'] >= 8 else '✅ Good' if final_state['quality_score'] >= 7 else '⚠️ Needs improvement'}")
+                st.write(f"**Decided By**: {final_state.get('judge_tier', 'llm')}")
                 st.write(f"**Action**: {'Accepted' if final_state['quality_score'] >= 7 else 'Retry with more context'}")
                 st.write(f"**Iterations**: {final_state['iteration_count']}")
-        
+                st.write(f"**Time**: {timing_line('judge')}")
+
+            if trace:
+                st.markdown("#### ⏱️ Node Timeline")
+                st.dataframe(
+                    [
+                        {
+                            "iteration": span.get("iteration", 0),
+                            "node": span["node"],
+                            "wall ms": span.get("wall_ms", 0.0),
+                            "embed ms": span.get("embed_ms", 0.0),
+                            "vector search ms": span.get("chroma_ms", 0.0),
+                            "tokens in": span.get("tokens_in"),
+                            "tokens out": span.get("tokens_out"),
+                            "cache hit": span.get("cache_hit"),
+                            "state KB": round(span.get("state_bytes", 0) / 1024, 1)
+                        }
+                        for span in trace
+                    ],
+                    use_container_width=True
+                )
+                st.caption(f"Trace id: {final_state.get('trace_id')}")
+
         st.divider()
         
         # -------------------------